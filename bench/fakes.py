@@ -0,0 +1,493 @@
+"""
+Local stand-ins for the remote services main.py talks to, so throughput can be measured on a box without network:
+a subset of the Zotero web API (library versions, 412 on stale writes), GROBID, arXiv (Atom API, RSS, PDFs) and
+Semantic Scholar. Every server takes `latency` (seconds added to each request, +-50%) and `failure_rate`
+(share of requests answered with an error) and counts its requests per route at `GET /_stats`.
+
+    python bench/fakes.py --papers 100     # serve until Ctrl-C, prints the env vars pointing main.py at them
+"""
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import datetime
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+KEY_CHARS = "23456789ABCDEFGHIJKLMNPQRSTUVWXYZ"
+
+
+def _seed(*parts):
+    return int(hashlib.sha1("/".join(map(str, parts)).encode()).hexdigest()[:12], 16)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _dispatch(self, method):
+        fake = self.server.fake
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if url.path == "/_stats":
+            return self._reply(200, {}, fake.stats())
+        name, handler, args = fake.match(method, url.path)
+        fake.hit(name)
+        if fake.latency:
+            time.sleep(fake.latency * fake.random.uniform(0.5, 1.5))
+        if handler is None:
+            return self._reply(404, {}, b"Not found")
+        if name not in fake.no_failures and fake.random.random() < fake.failure_rate:
+            fake.hit(name + ".injected_failure")
+            return self._reply(fake.failure_status, {}, b"[GENERAL] injected failure, exception")
+        status, headers, payload = handler({k: v[-1] for k, v in parse_qs(url.query).items()}, body, self.headers, *args)
+        self._reply(status, headers, payload, head=method == "HEAD")
+
+    def _reply(self, status, headers, payload, head=False):
+        if isinstance(payload, (dict, list)):
+            payload = json.dumps(payload).encode()
+            headers = {"Content-Type": "application/json", **headers}
+        elif isinstance(payload, str):
+            payload = payload.encode()
+        self.send_response(status)
+        for k, v in headers.items():
+            self.send_header(k, str(v))
+        self.send_header("Content-Length", str(len(payload or b"")))
+        self.end_headers()
+        if payload and not head:
+            self.wfile.write(payload)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_HEAD(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PATCH(self):
+        self._dispatch("PATCH")
+
+
+class FakeServer:
+    failure_status = 500
+    no_failures = ()  # routes never failed on purpose
+
+    def __init__(self, latency=0.0, failure_rate=0.0, seed=0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.routes = []  # (method, compiled path regex, route name, handler)
+        self._lock = threading.Lock()
+        self._httpd = None
+
+    def add_route(self, method, pattern, name, handler):
+        self.routes.append((method, re.compile(pattern + "$"), name, handler))
+
+    def match(self, method, path):
+        for m, pattern, name, handler in self.routes:
+            found = pattern.match(path)
+            if m == method and found:
+                return name, handler, found.groups()
+        return method + " " + path, None, ()
+
+    def hit(self, name):
+        with self._lock:
+            self.calls[name] += 1
+
+    def stats(self):
+        with self._lock:
+            return dict(self.calls)
+
+    def start(self, host="127.0.0.1", port=0):
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.fake = self
+        threading.Thread(target=self._httpd.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        self._httpd.shutdown()
+
+
+# region arXiv
+def make_pdf(title, size=0):
+    """A small valid one-page PDF showing `title`, padded with a comment to about `size` bytes."""
+    text = title.replace("\\", "").replace("(", "").replace(")", "")
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode()
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R /Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = bytearray(b"%PDF-1.4\n")
+    if size > 0:
+        out += b"%" + b"x" * max(0, size - 600) + b"\n"
+    offsets = []
+    for i, obj in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (i, obj)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % o for o in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref)
+    return bytes(out)
+
+
+class FakeArxiv(FakeServer):
+    """arXiv API (`/api/query`), RSS (`/rss/<category>`, with ETag) and PDFs (`/pdf/<id>.pdf`)."""
+    failure_status = 503
+
+    def __init__(self, papers=50, pdf_kb=200, corrupt_rate=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.pdf_size = pdf_kb << 10
+        self.corrupt_rate = corrupt_rate  # share of PDFs served cut short, as a download broken mid-way
+        now = datetime.datetime.now(datetime.timezone.utc).replace(microsecond=0)
+        self.papers = [{
+            "id": f"2401.{i:05d}v1",
+            "title": f"Benchmark paper {i} on streaming speech recognition",
+            "published": now - datetime.timedelta(hours=i),
+            "authors": [f"Author{j} Surname{i}" for j in range(3)],
+        } for i in range(papers)]
+        self.add_route("GET", r"/api/query", "query", self.query)
+        self.add_route("GET", r"/rss/([\w.]+)", "rss", self.rss)
+        self.add_route("GET", r"/pdf/([\w.]+)\.pdf", "pdf", self.pdf)
+
+    def _entry(self, p):
+        stamp = p["published"].strftime("%Y-%m-%dT%H:%M:%SZ")
+        authors = "".join(f"<author><name>{escape(a)}</name></author>" for a in p["authors"])
+        return (
+            f"<entry><id>http://arxiv.org/abs/{p['id']}</id><updated>{stamp}</updated><published>{stamp}</published>"
+            f"<title>{escape(p['title'])}</title><summary>Abstract of {escape(p['title'])}.</summary>{authors}"
+            f'<link href="http://arxiv.org/abs/{p["id"]}" rel="alternate" type="text/html"/>'
+            f'<link title="pdf" href="http://arxiv.org/pdf/{p["id"]}" rel="related" type="application/pdf"/>'
+            f'<arxiv:primary_category term="cs.SD"/><category term="cs.SD"/></entry>'
+        )
+
+    def query(self, params, body, headers):
+        papers = self.papers
+        if params.get("id_list"):
+            ids = {re.sub(r"v\d+$", "", i) for i in params["id_list"].split(",")}
+            papers = [p for p in papers if re.sub(r"v\d+$", "", p["id"]) in ids]
+        start, size = int(params.get("start", 0)), int(params.get("max_results", 10))
+        page = papers[start:start + size]
+        feed = (
+            '<?xml version="1.0" encoding="UTF-8"?>'
+            '<feed xmlns="http://www.w3.org/2005/Atom" xmlns:opensearch="http://a9.com/-/spec/opensearch/1.1/" xmlns:arxiv="http://arxiv.org/schemas/atom">'
+            f"<opensearch:totalResults>{len(papers)}</opensearch:totalResults>"
+            f"<opensearch:startIndex>{start}</opensearch:startIndex><opensearch:itemsPerPage>{size}</opensearch:itemsPerPage>"
+            + "".join(self._entry(p) for p in page) + "</feed>"
+        )
+        return 200, {"Content-Type": "application/atom+xml"}, feed
+
+    def rss(self, params, body, headers, category):
+        items = "".join(f"<item><title>{escape(p['title'])}</title><guid>oai:arXiv.org:{p['id']}</guid></item>" for p in self.papers[:20])
+        etag = '"' + hashlib.sha1(items.encode()).hexdigest()[:16] + '"'
+        if headers.get("If-None-Match") == etag:
+            return 304, {"ETag": etag}, b""
+        return 200, {"ETag": etag, "Content-Type": "application/rss+xml"}, f'<?xml version="1.0"?><rss version="2.0"><channel><title>{category}</title>{items}</channel></rss>'
+
+    def pdf(self, params, body, headers, aid):
+        paper = next((p for p in self.papers if p["id"].startswith(re.sub(r"v\d+$", "", aid))), None)
+        if paper is None:
+            return 404, {}, b""
+        pdf = make_pdf(paper["title"], self.pdf_size)
+        if self.random.random() < self.corrupt_rate:
+            pdf = pdf[:len(pdf) // 2]
+        return 200, {"Content-Type": "application/pdf"}, pdf
+# endregion
+
+
+# region GROBID
+def ref_title(i):
+    return f"Reference study {i} of acoustic models"
+
+
+def make_tei(title, refs, doi_share=0.5):
+    """GROBID-like TEI for a paper citing `refs` (indices into a shared pool of reference titles)."""
+    bibl = []
+    for i in refs:
+        idno = f'<idno type="DOI">10.5555/bench.{i}</idno>' if _seed("doi", i) % 100 < doi_share * 100 else ""
+        bibl.append(
+            f'<biblStruct xml:id="b{i}"><analytic><title level="a" type="main">{escape(ref_title(i))}</title>'
+            f'<author><persName><forename type="first">Ref</forename><surname>Author{i}</surname></persName></author></analytic>'
+            f'<monogr><title level="j">Journal {i % 7}</title><imprint><date type="published" when="{2000 + i % 24}">{2000 + i % 24}</date></imprint></monogr>'
+            f"{idno}</biblStruct>"
+        )
+    sections = "".join(
+        f'<div xmlns="http://www.tei-c.org/ns/1.0"><head n="{n}">Section {n}</head><p>Text of section {n} '
+        f'<ref type="bibr" target="#b{refs[0] if refs else 0}">[1]</ref>.</p>'
+        f'<formula xml:id="formula_{n}" coords="{n},10,20,30,40">x_{n} = y</formula></div>'
+        for n in range(1, 4)
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?><TEI xmlns="http://www.tei-c.org/ns/1.0"><teiHeader><fileDesc>'
+        f'<titleStmt><title level="a" type="main">{escape(title)}</title></titleStmt>'
+        '<publicationStmt><date type="published" when="2024-01-01">2024</date></publicationStmt>'
+        '<sourceDesc><biblStruct><analytic><author><persName><forename type="first">First</forename><surname>Author</surname></persName>'
+        '<affiliation><orgName type="institution">Bench University</orgName><address><country>Nowhere</country></address></affiliation>'
+        '</author></analytic></biblStruct></sourceDesc></fileDesc><profileDesc>'
+        '<textClass><keywords><term>speech</term></keywords></textClass>'
+        f'<abstract><div xmlns="http://www.tei-c.org/ns/1.0"><p>Abstract of {escape(title)}.</p></div></abstract>'
+        f"</profileDesc></teiHeader><text><body>{sections}"
+        '<figure xmlns="http://www.tei-c.org/ns/1.0" xml:id="fig_0"><head>Fig. 1</head><label>1</label><figDesc>Overview.</figDesc></figure>'
+        f'</body><back><div type="references"><listBibl>{"".join(bibl)}</listBibl></div></back></text></TEI>'
+    )
+
+
+class FakeGrobid(FakeServer):
+    """
+    `/api/isalive` and `/api/processFulltextDocument`. Answers with the recorded TEI files of `tei_dir` if given,
+    else with generated TEI citing `refs` references drawn from a pool of `ref_pool`, so papers share references.
+    """
+    failure_status = 503
+    no_failures = ("isalive",)  # a server failing its health check is skipped for the whole run
+
+    def __init__(self, tei_dir=None, refs=20, ref_pool=300, doi_share=0.5, **kwargs):
+        super().__init__(**kwargs)
+        self.refs, self.ref_pool, self.doi_share = refs, ref_pool, doi_share
+        self.recorded = []
+        if tei_dir:
+            import gzip
+            from pathlib import Path
+            for p in sorted(Path(tei_dir).rglob("*")):
+                if p.name.endswith(".tei.gz"):
+                    self.recorded.append(gzip.open(p, "rt").read())
+                elif p.name.endswith(".tei.xml"):
+                    self.recorded.append(p.read_text())
+        self.add_route("GET", r"/api/isalive", "isalive", lambda *args: (200, {}, "true"))
+        self.add_route("POST", r"/api/processFulltextDocument", "process", self.process)
+
+    def process(self, params, body, headers):
+        seed = _seed(hashlib.sha1(body).hexdigest())
+        if self.recorded:
+            return 200, {"Content-Type": "application/xml"}, self.recorded[seed % len(self.recorded)]
+        found = re.search(rb"\((.*?)\) Tj", body)
+        title = found.group(1).decode() if found else "Untitled"
+        refs = random.Random(seed).sample(range(self.ref_pool), min(self.refs, self.ref_pool))
+        return 200, {"Content-Type": "application/xml"}, make_tei(title, refs, self.doi_share)
+# endregion
+
+
+# region Semantic Scholar
+class FakeSemanticScholar(FakeServer):
+    """`/paper/batch` and `/paper/search`; `found_rate` of the papers are known. Failures are 429s."""
+    failure_status = 429
+
+    def __init__(self, found_rate=0.8, **kwargs):
+        super().__init__(**kwargs)
+        self.found_rate = found_rate
+        self.add_route("POST", r"/paper/batch", "batch", self.batch)
+        self.add_route("GET", r"/paper/search", "search", self.search)
+
+    def _paper(self, ident, title):
+        if _seed("found", ident) % 100 >= self.found_rate * 100:
+            return None
+        return {
+            "title": title, "abstract": f"Abstract of {title}.", "publicationDate": "2020-01-01",
+            "journal": {"name": "Bench Journal", "volume": "1", "pages": "1-10"}, "venue": "Bench Conference",
+            "externalIds": {"DOI": ident if ident.startswith("10.") else "", "DBLP": "bench/" + ident},
+            "url": "https://www.semanticscholar.org/paper/" + hashlib.sha1(ident.encode()).hexdigest(),
+            "fieldsOfStudy": ["Computer Science"], "authors": [{"name": "Ref Author"}], "publicationVenue": {"url": ""}, "citationCount": 1,
+        }
+
+    def batch(self, params, body, headers):
+        ids = json.loads(body)["ids"]
+        papers = []
+        for pid in ids:
+            kind, _, value = pid.partition(":")
+            i = value.rsplit(".", 1)[-1]
+            papers.append(self._paper(value, ref_title(i) if i.isdigit() else value))
+        return 200, {}, papers
+
+    def search(self, params, body, headers):
+        paper = self._paper(params.get("query", ""), params.get("query", ""))
+        return 200, {}, {"total": int(paper is not None), "data": [paper] if paper else []}
+# endregion
+
+
+# region Zotero
+FIELDS = [
+    "title", "abstractNote", "date", "url", "accessDate", "archive", "archiveID", "archiveLocation", "libraryCatalog",
+    "extra", "DOI", "shortTitle", "volume", "pages", "proceedingsTitle", "conferenceName", "publicationTitle",
+    "publisher", "repository", "number", "series", "language", "rights", "callNumber",
+]
+
+
+class FakeZotero(FakeServer):
+    """
+    One library with a version counter: `items` (q / since / start / limit, Link paging), `items/<key>`, `deleted`,
+    item templates, `itemFields`, `POST items` (batch create, children need an existing parent; objects with the key
+    and version of an existing item update it) and `PATCH items/<key>` with If-Unmodified-Since-Version.
+    `conflict_rate` of the updates find the item changed by "another client" and get a 412; `object_failure_rate`
+    of created objects come back as `failed`.
+    """
+    def __init__(self, library_type="group", library_id="1", conflict_rate=0.0, object_failure_rate=0.0, **kwargs):
+        super().__init__(**kwargs)
+        self.library = {"type": library_type, "id": int(library_id), "name": "bench", "links": {}}
+        self.conflict_rate, self.object_failure_rate = conflict_rate, object_failure_rate
+        self.version = 0
+        self.items, self.deleted = {}, {}
+        self.write_lock = threading.Lock()
+        lib = rf"/{library_type}s/{library_id}"
+        self.add_route("GET", r"/items/new", "template", self.template)
+        self.add_route("GET", r"/itemFields", "item_fields", lambda *args: (200, {}, [{"field": f, "localized": f} for f in FIELDS]))
+        self.add_route("GET", lib + r"/items", "items", self.list_items)
+        self.add_route("GET", lib + r"/items/(\w+)", "item", self.item)
+        self.add_route("GET", lib + r"/deleted", "deleted", self.list_deleted)
+        self.add_route("POST", lib + r"/items", "create_items", self.create_items)
+        self.add_route("PATCH", lib + r"/items/(\w+)", "update_item", self.update_item)
+        self.lib_path = lib
+
+    def _headers(self, **extra):
+        return {"Last-Modified-Version": self.version, **extra}
+
+    def template(self, params, body, headers):
+        item_type = params.get("itemType", "journalArticle")
+        if item_type == "note":
+            return 200, {}, {"itemType": "note", "note": "", "tags": [], "collections": [], "relations": {}}
+        return 200, {}, {"itemType": item_type, "creators": [{"creatorType": "author", "firstName": "", "lastName": ""}],
+                         **{f: "" for f in FIELDS}, "tags": [], "collections": [], "relations": {}}
+
+    def _json(self, item):
+        return {"key": item["key"], "version": item["version"], "library": self.library, "links": {}, "meta": {}, "data": item}
+
+    def list_items(self, params, body, headers):
+        with self.write_lock:
+            items = list(self.items.values())
+        if "since" in params:
+            items = [i for i in items if i["version"] > int(params["since"])]
+        if params.get("q"):
+            items = [i for i in items if params["q"].lower() in i.get("title", i.get("note", "")).lower()]
+        if params.get("itemKey"):
+            items = [i for i in items if i["key"] in params["itemKey"].split(",")]
+        if params.get("collectionKey"):
+            items = [i for i in items if params["collectionKey"] in i.get("collections", [])]
+        start, limit = int(params.get("start", 0)), int(params.get("limit") or 100)
+        page = items[start:start + limit]
+        headers = self._headers(**{"Total-Results": len(items)})
+        if start + limit < len(items):
+            query = "&".join(f"{k}={v}" for k, v in {**params, "start": start + limit, "limit": limit}.items())
+            headers["Link"] = f'<{self.url}{self.lib_path}/items?{query}>; rel="next"'
+        return 200, headers, [self._json(i) for i in page]
+
+    def item(self, params, body, headers, key):
+        item = self.items.get(key)
+        if item is None:
+            return 404, {}, "Not found"
+        return 200, self._headers(), self._json(item)
+
+    def list_deleted(self, params, body, headers):
+        since = int(params.get("since", 0))
+        keys = [k for k, v in self.deleted.items() if v > since]
+        return 200, self._headers(), {"collections": [], "items": keys, "searches": [], "tags": [], "settings": []}
+
+    def create_items(self, params, body, headers):
+        objects = json.loads(body)
+        response = {"successful": {}, "success": {}, "unchanged": {}, "failed": {}}
+        with self.write_lock:
+            self.version += 1
+            for idx, obj in enumerate(objects):
+                idx = str(idx)
+                key = obj.get("key") or "".join(self.random.choice(KEY_CHARS) for _ in range(8))
+                if key in self.items and "version" in obj:
+                    # an update of an existing object, PATCH semantics
+                    item = self.items[key]
+                    if self.random.random() < self.conflict_rate:
+                        # somebody else edited it meanwhile
+                        self.version += 1
+                        item["version"] = self.version
+                    if obj["version"] != item["version"]:
+                        response["failed"][idx] = {"key": key, "code": 412, "message": "Item has been modified since specified version"}
+                        continue
+                    item.update({k: v for k, v in obj.items() if k not in ("key", "version")}, version=self.version)
+                    response["successful"][idx] = self._json(item)
+                    response["success"][idx] = key
+                    continue
+                if obj.get("parentItem") and obj["parentItem"] not in self.items:
+                    response["failed"][idx] = {"key": key, "code": 400, "message": f"Parent item {obj['parentItem']} not found"}
+                    continue
+                if self.random.random() < self.object_failure_rate:
+                    response["failed"][idx] = {"key": key, "code": 500, "message": "injected failure"}
+                    continue
+                item = {**obj, "key": key, "version": self.version}
+                self.items[key] = item
+                response["successful"][idx] = self._json(item)
+                response["success"][idx] = key
+        return 200, self._headers(), response
+
+    def update_item(self, params, body, headers, key):
+        with self.write_lock:
+            item = self.items.get(key)
+            if item is None:
+                return 404, {}, "Not found"
+            if self.random.random() < self.conflict_rate:
+                # somebody else edited it meanwhile
+                self.version += 1
+                item["version"] = self.version
+            if int(headers.get("If-Unmodified-Since-Version", item["version"])) != item["version"]:
+                return 412, self._headers(), "Item has been modified since specified version"
+            self.version += 1
+            item.update({k: v for k, v in json.loads(body).items() if k not in ("key", "version")})
+            item["version"] = self.version
+        return 204, self._headers(), b""
+# endregion
+
+
+def start_all(papers=50, refs=20, ref_pool=300, grobid_servers=2, latency=None, failure=None, tei_dir=None, pdf_kb=200, seed=0):
+    """
+    Starts one of each fake (and `grobid_servers` GROBIDs) on free local ports.
+    :param latency: / failure: {"zotero" | "grobid" | "arxiv" | "sscholar": seconds / rate}
+    :return: {name: server}, env vars pointing main.py at them
+    """
+    latency, failure = latency or {}, failure or {}
+    knobs = lambda name, i=0: dict(latency=latency.get(name, 0.0), failure_rate=failure.get(name, 0.0), seed=seed + i)
+    servers = {
+        "zotero": FakeZotero(conflict_rate=failure.get("zotero_conflict", 0.0), object_failure_rate=failure.get("zotero_object", 0.0), **knobs("zotero")).start(),
+        "arxiv": FakeArxiv(papers=papers, pdf_kb=pdf_kb, corrupt_rate=failure.get("arxiv_pdf", 0.0), **knobs("arxiv")).start(),
+        "sscholar": FakeSemanticScholar(**knobs("sscholar")).start(),
+    }
+    for i in range(grobid_servers):
+        servers[f"grobid{i}"] = FakeGrobid(tei_dir=tei_dir, refs=refs, ref_pool=ref_pool, **knobs("grobid", i)).start()
+    env = {
+        "ZOTERO_ENDPOINT": servers["zotero"].url,
+        "GROBID_URLS": ",".join(s.url for name, s in servers.items() if name.startswith("grobid")),
+        "S2_API_URL": servers["sscholar"].url,
+        "ARXIV_API_URL": servers["arxiv"].url + "/api/query",
+        "ARXIV_RSS_URL": servers["arxiv"].url + "/rss",
+        "ARXIV_PDF_URL": servers["arxiv"].url + "/pdf/",
+        "GROUP_ID": "1", "USER_ID": "", "ZOTERO_KEY": "bench",
+    }
+    return servers, env
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--papers", type=int, default=50)
+    parser.add_argument("--refs", type=int, default=20)
+    args = parser.parse_args()
+    servers, env = start_all(papers=args.papers, refs=args.refs)
+    for k, v in env.items():
+        print(f"export {k}={v}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
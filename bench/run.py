@@ -0,0 +1,143 @@
+"""
+End-to-end throughput benchmark of `update_by_arxiv` against the local fakes of bench/fakes.py, no network needed:
+
+    python bench/run.py --papers 50 --refs 20 --latency zotero=0.05 --latency grobid=1 --fail grobid=0.1 --unlimited
+
+The fakes run in a child process, so the peak RSS reported is the pipeline's own. Reports papers/minute,
+remote calls per paper (by service and route), peak RSS and the stage timings of the metrics registry.
+"""
+import argparse
+import functools
+import json
+import multiprocessing
+import os
+from pathlib import Path
+import resource
+import sys
+import tempfile
+import time
+import urllib.request
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / "bench"))
+
+
+def knobs(pairs):
+    """["zotero=0.1", ...] -> {"zotero": 0.1}"""
+    return {k: float(v) for k, v in (pair.split("=") for pair in pairs)}
+
+
+def serve(conn, kwargs):
+    from fakes import start_all
+    servers, env = start_all(**kwargs)
+    conn.send((env, {name: s.url for name, s in servers.items()}))
+    conn.recv()  # until the benchmark is done
+
+
+def stats(url):
+    with urllib.request.urlopen(url + "/_stats") as res:
+        return json.load(res)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--papers", type=int, default=50, help="arXiv results to ingest")
+    parser.add_argument("--refs", type=int, default=20, help="references per paper")
+    parser.add_argument("--ref-pool", type=int, default=300, help="distinct references shared by all papers")
+    parser.add_argument("--grobid-servers", type=int, default=2)
+    parser.add_argument("--pdf-kb", type=int, default=200)
+    parser.add_argument("--tei-dir", help="serve recorded TEI (*.tei.gz / *.tei.xml, e.g. a GROBID parse cache) instead of generated TEI")
+    parser.add_argument("--latency", action="append", default=[], help="service=seconds, service in zotero / grobid / arxiv / sscholar")
+    parser.add_argument("--fail", action="append", default=[], help="service=rate, also zotero_conflict=rate (412s), zotero_object=rate and arxiv_pdf=rate (truncated PDFs)")
+    parser.add_argument("--workers", default="", help="stage workers, as PIPELINE_WORKERS (download=8,parse=4,...)")
+    parser.add_argument("--unlimited", action="store_true", help="lift the client-side rate limits (zotero 5/s, sscholar 1/s, arxiv, downloads)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="also write the report to this file")
+    parser.add_argument("--verbose", action="store_true", help="keep main.py's INFO logging")
+    args = parser.parse_args()
+    if args.json:
+        args.json = os.path.abspath(args.json)
+
+    conn, child_conn = multiprocessing.Pipe()
+    fakes = multiprocessing.Process(target=serve, args=(child_conn, dict(
+        papers=args.papers, refs=args.refs, ref_pool=args.ref_pool, grobid_servers=args.grobid_servers, pdf_kb=args.pdf_kb,
+        tei_dir=args.tei_dir, latency=knobs(args.latency), failure=knobs(args.fail), seed=args.seed,
+    )), daemon=True)
+    fakes.start()
+    env, urls = conn.recv()
+
+    # main.py reads its configuration from the environment at import time
+    workdir = Path(tempfile.mkdtemp(prefix="zotero-sync-bench-"))
+    os.chdir(workdir)
+    os.environ.update(env)
+    os.environ.update({"SAVE_ROOT": str(workdir / "papers"), "LOOKUP_CACHE": str(workdir / "lookup.sqlite"), "LOCAL_DB_PATH": str(workdir / "LOCAL_DB.sqlite")})
+    if args.workers:
+        os.environ["PIPELINE_WORKERS"] = args.workers
+    if args.unlimited:
+        os.environ.update({"IO_RATES": "zotero=0,sscholar=0,arxiv=0,dblp=0,gscholar=0", "DOWNLOAD_RATE": "0"})
+
+    import logging
+    import main
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.WARNING)
+    from pyzotero import zotero
+    from citegraph import CitationGraph
+    from harvest import HarvestState
+    from library import LibraryMirror
+    from metrics import METRICS
+    from pdfcheck import shared_checker, shutdown_checker
+    from pipeline import PipelineError
+    from sources import ArxivClient, ArxivQuery, fetch_all
+    import sscholar
+    from zotero_batch import close_writers
+
+    shared_checker()
+    zot = zotero.Zotero(env["GROUP_ID"], "group", env["ZOTERO_KEY"])
+    zot.endpoint = env["ZOTERO_ENDPOINT"]
+    main.GROBID.check_all()
+    main.LIBRARY = LibraryMirror(zot, str(workdir / "mirror.json.gz"))
+    main.LIBRARY.sync()
+    main.RESOLVER_PREFETCH = sscholar.prefetch
+    main.CITEGRAPH = CitationGraph(str(workdir / "citegraph"))
+    update_db = functools.partial(main.create_db_from_public, retrieve_info_func=sscholar.retrieve_info, save_root=workdir / "papers" / "DATABASE", collection="REFS", zot=zot)
+
+    start = time.perf_counter()
+    source = ArxivQuery("BENCH", "BENCHCOL", {"query": "cat:cs.SD"}, args.papers)
+    results = [r for _, found in fetch_all([source], ArxivClient(), HarvestState(str(workdir / "harvest.json"))) for r in found]
+    fetched = time.perf_counter()
+    try:
+        main.update_by_arxiv(results, workdir / "papers", "BENCHCOL", zot, update_db_callback=update_db)
+    except PipelineError as e:
+        # injected failures, counted in the stage.*.failed metrics
+        logging.warning(f"Bench run: {e}")
+    close_writers()
+    main.CITEGRAPH.save()
+    elapsed = time.perf_counter() - start
+
+    calls = {name: stats(url) for name, url in urls.items()}
+    conn.send("done")
+    papers = max(1, len(results))
+    report = {
+        "papers": len(results),
+        "refs_per_paper": args.refs,
+        "seconds": round(elapsed, 2),
+        "arxiv_fetch_seconds": round(fetched - start, 2),
+        "papers_per_minute": round(len(results) / elapsed * 60, 2),
+        "calls_per_paper": {name: round(sum(routes.values()) / papers, 2) for name, routes in calls.items()},
+        "calls": calls,
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),  # KiB on Linux
+        "metrics": METRICS.report(),
+    }
+    print(f"{report['papers']} papers in {report['seconds']}s: {report['papers_per_minute']} papers/min, peak RSS {report['peak_rss_mb']} MB")
+    for name, per_paper in report["calls_per_paper"].items():
+        print(f"  {name:>10}: {per_paper:6.2f} calls/paper  {calls[name]}")
+    for name, timing in report["metrics"]["timings"].items():
+        if name.startswith("stage."):
+            print(f"  {name:>16}: mean {timing['mean']}s  p90 <= {timing['p90']}s  ({timing['count']} calls)")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=1)
+    main.DOWNLOADER.shutdown()
+    main.LOCAL_DB.close()
+    shutdown_checker()
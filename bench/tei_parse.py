@@ -0,0 +1,78 @@
+"""
+Compares the lxml TEI extraction (`tei.parse`) with the BeautifulSoup / scipdf one (`main.parse_tei_scipdf`)
+on saved TEI files, e.g. the GROBID parse cache:
+
+    python bench/tei_parse.py $SAVE_ROOT/.grobid_cache [--repeat 3]
+
+Reports time and peak python heap per engine, and the fields where the two disagree.
+"""
+import argparse
+import gzip
+import os
+from pathlib import Path
+import sys
+import time
+import tracemalloc
+import warnings
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def load(paths):
+    files = []
+    for path in map(Path, paths):
+        files.extend(sorted(p for p in path.rglob("*") if p.name.endswith((".tei.gz", ".tei.xml"))) if path.is_dir() else [path])
+    for p in files:
+        opener = gzip.open if p.suffix == ".gz" else open
+        with opener(p, "rt") as f:
+            yield p.name, f.read()
+
+
+def run(engine, corpus, repeat):
+    results = {}
+    tracemalloc.start()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for name, tei in corpus:
+            results[name] = engine(tei, name)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return results, elapsed, peak
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("paths", nargs="+", help="TEI files, or directories searched for *.tei.gz / *.tei.xml")
+    parser.add_argument("--repeat", type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ.setdefault("SAVE_ROOT", ".")
+    warnings.filterwarnings("ignore")
+    from main import parse_tei_lxml, parse_tei_scipdf
+
+    corpus = list(load(args.paths))
+    if not corpus:
+        sys.exit("no TEI files found")
+    mb = sum(len(tei) for _, tei in corpus) / 2 ** 20
+    print(f"{len(corpus)} TEI files, {mb:.1f} MB, {args.repeat} repeats")
+
+    runs, times = {}, {}
+    for label, engine in (("scipdf", parse_tei_scipdf), ("lxml", parse_tei_lxml)):
+        results, elapsed, peak = run(engine, corpus, args.repeat)
+        runs[label], times[label] = results, elapsed
+        per_file = elapsed / (len(corpus) * args.repeat) * 1000
+        # tracemalloc sees the python heap only, not libxml2's own buffers
+        print(f"{label:>7}: {elapsed:8.2f}s  {per_file:8.1f} ms/file  peak python heap {peak / 2 ** 20:8.1f} MB")
+    print(f"speedup: {times['scipdf'] / times['lxml']:.1f}x")
+
+    mismatches = {}
+    for name, _ in corpus:
+        a, b = runs["scipdf"][name], runs["lxml"][name]
+        for field in sorted(set(a) | set(b)):
+            if a.get(field) != b.get(field):
+                mismatches.setdefault(field, []).append(name)
+    for field, names in mismatches.items():
+        print(f"differs in {field}: {len(names)} files, e.g. {names[:3]}")
+    if not mismatches:
+        print("identical output on every file")
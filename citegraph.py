@@ -0,0 +1,286 @@
+"""
+Local citation graph of the ingested papers, so "which of our papers cite X" needs no zotero query.
+
+    python citegraph.py missing --top 50      # most-referenced papers not in the library yet
+    python citegraph.py cited-by <key or title>
+    python citegraph.py cocited <key or title>
+"""
+from collections import Counter
+import json
+import logging
+import os
+import threading
+
+import numpy as np
+
+from library import arxiv_id
+from localdb import normalize_title
+
+
+class CitationGraph:
+    """
+    Papers and references get integer ids (their position in `nodes`); a node is in the library when it has
+    a zotero item key. Edges are kept as CSR arrays in both directions (citing -> cited and cited -> citing),
+    saved as .npy files in `path` and memory-mapped on load, so opening a large graph costs no parsing.
+    Papers added since the last `save` are also appended to a log and replayed on load, nothing is lost
+    if the run dies before `save`.
+    New edges stay pending until a traversal (`cites`, `cited_by`, `cocited`), `save` or `compile_every` of
+    them rebuild the arrays; citation counts are kept up to date without a rebuild.
+    """
+    ARRAYS = ("out_indptr", "out_indices", "in_indptr", "in_indices")
+
+    def __init__(self, path, compile_every=100_000):
+        self.path = path
+        self.compile_every = compile_every
+        self.nodes = []
+        self._by_key, self._by_title, self._by_doi, self._by_arxiv = {}, {}, {}, {}
+        self._lock = threading.RLock()
+        self._pending = set()  # (citing, cited) not compiled into the arrays yet
+        self._pending_in = Counter()  # cited -> pending edges to it
+        self._set_csr(self._empty())
+        os.makedirs(path, exist_ok=True)
+        try:
+            self._load()
+        except Exception as e:
+            logging.warning(f"Drop broken citation graph {path}: {e}")
+            self.nodes, self._pending, self._pending_in = [], set(), Counter()
+            self._by_key, self._by_title, self._by_doi, self._by_arxiv = {}, {}, {}, {}
+            self._set_csr(self._empty())
+        self._log = open(os.path.join(path, "pending.jsonl"), "a")
+
+    @staticmethod
+    def _empty():
+        # node ids fit in int32, the offsets of a large graph may not
+        return {"out_indptr": np.zeros(1, dtype=np.int64), "out_indices": np.zeros(0, dtype=np.int32),
+                "in_indptr": np.zeros(1, dtype=np.int64), "in_indices": np.zeros(0, dtype=np.int32)}
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        if os.path.exists(self._file("nodes.json")):
+            with open(self._file("nodes.json")) as f:
+                self.nodes = json.load(f)
+            for i, node in enumerate(self.nodes):
+                self._index(i, node)
+            csr = {name: np.load(self._file(name + ".npy"), mmap_mode="r") for name in self.ARRAYS}
+            if len(csr["out_indptr"]) != len(self.nodes) + 1 or len(csr["in_indptr"]) != len(self.nodes) + 1:
+                raise ValueError("arrays do not match nodes.json")
+            self._set_csr(csr)
+        if os.path.exists(self._file("pending.jsonl")):
+            with open(self._file("pending.jsonl")) as f:
+                for line in f:
+                    if line.strip():
+                        paper = json.loads(line)
+                        self._add(paper["paper"], paper["refs"])
+
+    # region nodes
+    def _index(self, i, node):
+        for index, k in ((self._by_key, node["key"]), (self._by_doi, node["doi"]), (self._by_arxiv, node["arxiv"]), (self._by_title, normalize_title(node["title"]))):
+            if k:
+                index.setdefault(k, i)
+
+    def _node(self, key="", title="", doi="", arxiv=""):
+        """id of the node matching any of the identifiers, created if none does; fills in what it lacked"""
+        norm = normalize_title(title) if title else ""
+        doi = (doi or "").lower()
+        arxiv = arxiv_id(arxiv)
+        for index, k in ((self._by_key, key), (self._by_doi, doi), (self._by_arxiv, arxiv), (self._by_title, norm)):
+            if k and k in index:
+                i = index[k]
+                break
+        else:
+            i = len(self.nodes)
+            self.nodes.append({"key": "", "title": "", "doi": "", "arxiv": ""})
+        node = self.nodes[i]
+        for name, index, k, value in (("key", self._by_key, key, key), ("doi", self._by_doi, doi, doi),
+                                      ("arxiv", self._by_arxiv, arxiv, arxiv), ("title", self._by_title, norm, title)):
+            if k and not node[name]:
+                node[name] = value
+                index.setdefault(k, i)
+        return i
+
+    def find(self, ref):
+        """node id of a zotero key, DOI, arXiv id or title; None if unknown"""
+        if isinstance(ref, (int, np.integer)):
+            return int(ref) if 0 <= ref < len(self.nodes) else None
+        with self._lock:
+            for index, k in ((self._by_key, ref), (self._by_doi, ref.lower()), (self._by_arxiv, arxiv_id(ref)), (self._by_title, normalize_title(ref))):
+                if k and k in index:
+                    return index[k]
+        return None
+
+    @staticmethod
+    def describe(item):
+        """identifiers of a zotero item (`{"key", "data": {...}}`) or a parsed `__refs` entry"""
+        if "data" in item:
+            data = item["data"]
+            return {"key": item["key"], "title": data.get("title", ""), "doi": data.get("DOI", ""),
+                    "arxiv": data.get("archiveID") or data.get("extra") or ""}
+        return {"title": item.get("title", ""), "doi": item.get("doi", ""), "arxiv": item.get("arxiv", "")}
+    # endregion
+
+    def _add(self, paper, refs):
+        src = self._node(**paper)
+        for ref in refs:
+            dst = self._node(**ref)
+            # an edge seen before (e.g. from a resumed paper) would count twice
+            if dst != src and (src, dst) not in self._pending and not self._compiled(src, dst):
+                self._pending.add((src, dst))
+                self._pending_in[dst] += 1
+
+    def add_paper(self, paper, refs):
+        """
+        Records that `paper` cites `refs`, both given as zotero items or `__refs` entries.
+        References without a zotero key are the ones not in the library; adding them again later with their key
+        (e.g. once `create_db_from_public` made the item) marks them as in the library.
+        """
+        paper = self.describe(paper)
+        refs = [self.describe(ref) for ref in refs]
+        refs = [ref for ref in refs if ref.get("key") or ref["title"] or ref["doi"] or ref["arxiv"]]
+        with self._lock:
+            self._add(paper, refs)
+            self._log.write(json.dumps({"paper": paper, "refs": refs}) + "\n")
+            self._log.flush()
+            if len(self._pending) >= self.compile_every:
+                self._compile()
+
+    # region CSR
+    def _set_csr(self, csr):
+        self._csr = csr
+        # citation counts of the compiled edges, `_pending_in` adds the rest
+        self._in_degree = np.diff(np.asarray(csr["in_indptr"]))
+
+    def _compiled(self, src, dst):
+        """whether the arrays hold the edge src -> dst"""
+        indptr = self._csr["out_indptr"]
+        if src + 1 >= len(indptr):
+            return False
+        row = self._csr["out_indices"][indptr[src]:indptr[src + 1]]
+        j = np.searchsorted(row, dst)
+        return j < len(row) and row[j] == dst
+
+    def _in_degrees(self, ids):
+        """times each node of `ids` is cited, compiled and pending edges together"""
+        with self._lock:
+            degree, pending = self._in_degree, self._pending_in
+            return [int(degree[i]) + pending[i] if i < len(degree) else pending[i] for i in ids]
+
+    def _compile(self):
+        """merges the pending edges into the CSR arrays (in memory, until the next `save`)"""
+        with self._lock:
+            n = len(self.nodes)
+            if not self._pending and len(self._csr["out_indptr"]) == n + 1:
+                return self._csr
+            indptr = self._csr["out_indptr"]
+            old_src = np.repeat(np.arange(len(indptr) - 1, dtype=np.int64), np.diff(indptr))
+            pending = np.array(list(self._pending), dtype=np.int64).reshape(-1, 2)
+            src = np.concatenate([old_src, pending[:, 0]])
+            dst = np.concatenate([np.asarray(self._csr["out_indices"], dtype=np.int64), pending[:, 1]])
+            # sorted by (citing, cited) and without duplicate edges, e.g. from a resumed paper
+            edges = np.unique(src * n + dst)
+            src, dst = edges // n, edges % n
+            by_dst = np.lexsort((src, dst))
+            csr = {
+                "out_indptr": np.concatenate([[0], np.cumsum(np.bincount(src, minlength=n))]),
+                "out_indices": dst.astype(np.int32),
+                "in_indptr": np.concatenate([[0], np.cumsum(np.bincount(dst, minlength=n))]),
+                "in_indices": src[by_dst].astype(np.int32),
+            }
+            self._set_csr(csr)
+            self._pending, self._pending_in = set(), Counter()
+            return csr
+
+    def save(self):
+        with self._lock:
+            csr = self._compile()
+            for name in self.ARRAYS:
+                tmp = self._file(name + ".tmp.npy")
+                np.save(tmp, np.asarray(csr[name]))
+                os.replace(tmp, self._file(name + ".npy"))
+            tmp = self._file("nodes.json.tmp")
+            with open(tmp, "w") as f:
+                json.dump(self.nodes, f)
+            os.replace(tmp, self._file("nodes.json"))
+            self._log.truncate(0)
+            self._set_csr({name: np.load(self._file(name + ".npy"), mmap_mode="r") for name in self.ARRAYS})
+        logging.info(f"Citation graph: {len(self.nodes)} nodes, {len(csr['out_indices'])} edges")
+
+    def close(self):
+        self._log.close()
+    # endregion
+
+    # region queries
+    def _neighbours(self, ref, direction):
+        i = self.find(ref)
+        if i is None:
+            return np.zeros(0, dtype=np.int64)
+        csr = self._compile()
+        indptr, indices = csr[direction + "_indptr"], csr[direction + "_indices"]
+        return np.asarray(indices[indptr[i]:indptr[i + 1]])
+
+    def cites(self, ref):
+        """nodes `ref` cites"""
+        return [self.nodes[i] for i in self._neighbours(ref, "out")]
+
+    def cited_by(self, ref):
+        """nodes citing `ref`"""
+        return [self.nodes[i] for i in self._neighbours(ref, "in")]
+
+    def cocited(self, ref, top=20):
+        """:return: [(node, n)], the nodes cited together with `ref` by n papers, most often first"""
+        i = self.find(ref)
+        citing = self._neighbours(ref, "in")
+        if i is None or not len(citing):
+            return []
+        csr = self._compile()
+        indptr, indices = csr["out_indptr"], csr["out_indices"]
+        together = np.concatenate([np.asarray(indices[indptr[c]:indptr[c + 1]]) for c in citing])
+        counts = np.bincount(together, minlength=len(self.nodes))
+        counts[i] = 0
+        order = np.argsort(-counts, kind="stable")[:top]
+        return [(self.nodes[j], int(counts[j])) for j in order if counts[j]]
+
+    def times_cited(self, ref):
+        return self.times_cited_many([ref])[0]
+
+    def times_cited_many(self, refs):
+        """`times_cited` of each of `refs`, without rebuilding the arrays"""
+        ids = [self.find(ref) for ref in refs]
+        counts = iter(self._in_degrees([i for i in ids if i is not None]))
+        return [0 if i is None else next(counts) for i in ids]
+
+    def missing(self, top=50):
+        """:return: [(node, n)], the references not in the library cited by the most papers"""
+        with self._lock:
+            n = len(self.nodes)
+            counts = np.zeros(n, dtype=np.int64)
+            counts[:len(self._in_degree)] = self._in_degree
+            for i, k in self._pending_in.items():
+                counts[i] += k
+            in_library = np.fromiter((bool(node["key"]) for node in self.nodes), dtype=bool, count=n)
+        counts = np.where(in_library, 0, counts)
+        order = np.argsort(-counts, kind="stable")[:top]
+        return [(self.nodes[i], int(counts[i])) for i in order if counts[i]]
+    # endregion
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("query", choices=("missing", "cites", "cited-by", "cocited"))
+    parser.add_argument("ref", nargs="?", help="zotero key, DOI, arXiv id or title")
+    parser.add_argument("--top", type=int, default=50)
+    parser.add_argument("--path", default=os.environ.get("CITEGRAPH", "CITEGRAPH"))
+    args = parser.parse_args()
+
+    graph = CitationGraph(args.path)
+    if args.query == "missing":
+        rows = graph.missing(args.top)
+    elif args.query == "cocited":
+        rows = graph.cocited(args.ref, args.top)
+    else:
+        rows = [(node, "") for node in (graph.cites if args.query == "cites" else graph.cited_by)(args.ref)]
+    for node, n in rows:
+        print(f"{n:>5}  {node['key'] or '-':8}  {node['title'] or node['doi'] or node['arxiv']}")
+    graph.close()
@@ -0,0 +1,264 @@
+"""
+Long-running service instead of the cron-launched main.py: clients, connection pools, the GROBID health state and
+the library indices stay warm, and each source of search.py is ingested on its own interval.
+
+    python daemon.py serve      # SCHEDULE="ARXIV_ASR=30m,ARXIV_SD_AS=10m", other sources every DAEMON_INTERVAL (1h)
+    python daemon.py ingest 2310.17558 2309.09838 --source ARXIV_ASR --tag xun.gong
+    python daemon.py run ARXIV_SD_AS
+    python daemon.py status
+
+`serve` listens on 127.0.0.1:DAEMON_PORT (8765), the other commands talk to it:
+    POST /ingest {"ids": [...], "source": name, "tags": [...]}  ad-hoc arXiv ids, filed like the results of `source`
+    POST /run/<source name>                                     a scheduled source now
+    GET  /status                                                schedule, queue, recent jobs, metrics
+"""
+import argparse
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import itertools
+import json
+import logging
+import os
+import queue
+import re
+import signal
+import threading
+import time
+import urllib.error
+import urllib.request
+
+ARXIV_ID_RE = re.compile(r"^(\d{4}\.\d{4,5}|[a-z-]+(\.[A-Z]{2})?/\d{7})(v\d+)?$")
+UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+def parse_interval(text):
+    """"90" / "30m" / "2h" -> seconds"""
+    text = text.strip()
+    if text[-1:] in UNITS:
+        return float(text[:-1]) * UNITS[text[-1]]
+    return float(text)
+
+
+def parse_schedule(text):
+    """"ARXIV_ASR=30m,ARXIV_SD_AS=10m" -> {source name: seconds}"""
+    return {name: parse_interval(interval) for name, interval in (kv.split("=") for kv in text.split(",") if kv)}
+
+
+class Daemon:
+    """
+    A scheduler thread queues the sources that are due, one worker thread runs the queued jobs through
+    `main.ingest` one at a time (main's module state is switched per library, so jobs never overlap).
+    Sources due at the same time are fetched in one job, and a source already queued is not queued twice.
+    RUN_REPORT / METRICS_TEXTFILE hold the metrics of the last job.
+    """
+    def __init__(self, run, sources, schedule=None, default_interval=3600, history=50):
+        self.run = run
+        # sources no library subscribes to are neither scheduled nor accepted as the template of an id list
+        self.sources = [source for source in sources if any(lib.subscribes(source) for lib in run["libraries"])]
+        self.intervals = {source.key: (schedule or {}).get(source.name, default_interval) for source in self.sources}
+        self.due = {source.key: 0.0 for source in self.sources}  # everything once at startup
+        self.jobs = queue.Queue()
+        self.queued = set()  # source keys waiting in `jobs`
+        self.current = None
+        self.history = deque(maxlen=history)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._threads = []
+
+    # region jobs
+    def _submit(self, kind, sources):
+        job = {"id": next(self._ids), "kind": kind, "sources": [source.key for source in sources], "queued": time.time()}
+        with self._lock:
+            self.queued.update(job["sources"])
+        self.jobs.put((job, sources))
+        logging.info(f"Job {job['id']} queued: {kind} {job['sources']}")
+        return dict(job)
+
+    def trigger(self, name):
+        """queues the scheduled sources named `name` now; :return: the job, None if there is no such source"""
+        with self._lock:
+            sources = [source for source in self.sources if source.name == name and source.key not in self.queued]
+        if not sources:
+            return None
+        return self._submit("manual", sources)
+
+    def ingest_ids(self, ids, source_name=None, tags=()):
+        """queues an ad-hoc ingest of arXiv `ids`, filed under the collection / name of the scheduled source `source_name`"""
+        from sources import IdList
+        template = next((source for source in self.sources if source.name == source_name or not source_name), None)
+        if template is None:
+            raise KeyError(source_name)
+        return self._submit("ids", [IdList(template.name, template.collection, ids, list(template.tags) + [t for t in tags if t not in template.tags])])
+
+    def _schedule_loop(self):
+        while not self._stopping.is_set():
+            now = time.time()
+            with self._lock:
+                due = [source for source in self.sources if self.due[source.key] <= now and source.key not in self.queued and source.key not in (self.current or {}).get("sources", ())]
+            if due:
+                self._submit("scheduled", due)
+            with self._lock:
+                waiting = [self.due[source.key] for source in self.sources if source.key not in self.queued]
+            self._stopping.wait(min(60.0, max(1.0, min(waiting, default=now + 60) - time.time())))
+
+    def _work_loop(self):
+        import main
+        from metrics import METRICS
+        while not self._stopping.is_set():
+            try:
+                job, sources = self.jobs.get(timeout=1)
+            except queue.Empty:
+                continue
+            job["started"] = time.time()
+            with self._lock:
+                self.queued.difference_update(job["sources"])
+                self.current = job
+            METRICS.reset()
+            try:
+                # an id list is a one-off, the harvest state keeps no entry for it
+                job["failed"] = [lib.name for lib in main.ingest(self.run, sources, mark=job["kind"] != "ids")]
+            except Exception as e:
+                logging.exception(f"Job {job['id']} failed: {e}")
+                job["error"] = f"{type(e).__name__}: {e}"
+            job["finished"] = time.time()
+            with self._lock:
+                # intervals run start to start; a failed source is retried on its next turn
+                for key in job["sources"]:
+                    if key in self.due:
+                        self.due[key] = job["started"] + self.intervals[key]
+                self.current = None
+                self.history.append(job)
+            logging.info(f"Job {job['id']} done in {job['finished'] - job['started']:.1f}s")
+            main.report()
+    # endregion
+
+    def status(self):
+        from lookup_cache import shared_cache
+        from metrics import METRICS
+        with self._lock:
+            return {
+                "schedule": {key: {"interval": self.intervals[key], "next": self.due[key]} for key in self.due},
+                "queued": sorted(self.queued),
+                "current": dict(self.current) if self.current else None,
+                "history": [dict(job) for job in self.history],
+                "metrics": {**METRICS.report(), "lookup": shared_cache().snapshot()},
+            }
+
+    def start(self):
+        for target, name in ((self._schedule_loop, "scheduler"), (self._work_loop, "ingest")):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """lets the running job finish, queued ones are dropped"""
+        self._stopping.set()
+        for thread in self._threads:
+            thread.join(timeout)
+
+
+def make_handler(daemon):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, body):
+            data = json.dumps(body, default=str).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/status":
+                return self._reply(200, daemon.status())
+            self._reply(404, {"error": "not found"})
+
+        def do_POST(self):
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                return self._reply(400, {"error": "invalid JSON"})
+            if self.path.rstrip("/") == "/ingest":
+                ids = body.get("ids") or []
+                invalid = [i for i in ids if not isinstance(i, str) or not ARXIV_ID_RE.match(i)]
+                if not ids or invalid:
+                    return self._reply(400, {"error": f"expected arXiv ids, got {invalid or ids}"})
+                try:
+                    job = daemon.ingest_ids(ids, body.get("source"), body.get("tags") or [])
+                except KeyError:
+                    return self._reply(404, {"error": f"no source named {body.get('source')} that a library subscribes to"})
+                return self._reply(202, job)
+            if self.path.startswith("/run/"):
+                job = daemon.trigger(self.path[len("/run/"):])
+                if job is None:
+                    return self._reply(404, {"error": "no such source, or it is queued already"})
+                return self._reply(202, job)
+            self._reply(404, {"error": "not found"})
+
+        def log_message(self, format, *args):
+            logging.debug("control: " + format % args)
+
+    return Handler
+
+
+def serve(args):
+    import main
+    from search import SOURCES
+
+    run = main.start(no_cache=args.no_cache)
+    daemon = Daemon(run, SOURCES, parse_schedule(os.environ.get("SCHEDULE", "")), parse_interval(os.environ.get("DAEMON_INTERVAL", "1h")))
+    server = ThreadingHTTPServer(("127.0.0.1", args.port), make_handler(daemon))
+    server.daemon_threads = True
+
+    def shutdown(signum, frame):
+        logging.info(f"Signal {signum}, stopping after the running job")
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, shutdown)
+    signal.signal(signal.SIGINT, shutdown)
+    daemon.start()
+    logging.info(f"Control endpoint on http://127.0.0.1:{args.port}, {len(SOURCES)} sources scheduled")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        daemon.stop()
+        main.stop(run)
+
+
+def call(port, method, path, body=None):
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}{path}", method=method,
+        data=json.dumps(body).encode() if body is not None else None, headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=30) as res:
+            return json.load(res)
+    except urllib.error.HTTPError as e:
+        raise SystemExit(f"{e.code}: {json.load(e).get('error')}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=int(os.environ.get("DAEMON_PORT", 8765)))
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("serve")
+    p.add_argument("--no-cache", action="store_true", help="do not use the GROBID parse cache")
+    p = commands.add_parser("ingest", help="ingest arXiv ids now")
+    p.add_argument("ids", nargs="+")
+    p.add_argument("--source", help="file them like the results of this source, default the first one")
+    p.add_argument("--tag", action="append", default=[])
+    p = commands.add_parser("run", help="run a scheduled source now")
+    p.add_argument("source")
+    commands.add_parser("status")
+    args = parser.parse_args()
+
+    if args.command == "serve":
+        serve(args)
+    elif args.command == "ingest":
+        print(json.dumps(call(args.port, "POST", "/ingest", {"ids": args.ids, "source": args.source, "tags": args.tag}), indent=1))
+    elif args.command == "run":
+        print(json.dumps(call(args.port, "POST", f"/run/{args.source}"), indent=1))
+    else:
+        print(json.dumps(call(args.port, "GET", "/status"), indent=1, default=str))
@@ -1,4 +1,5 @@
 import logging
+import time
 
 import bibtex_dblp.config
 import bibtex_dblp.database
@@ -6,6 +7,15 @@ import bibtex_dblp.dblp_api
 from bibtex_dblp.dblp_api import BibFormat
 import bibtex_dblp.io
 
+from executor import rate_limit
+from lookup_cache import shared_cache, title_key
+
+
+def _search_publication(search_string, max_search_results):
+    rate_limit("dblp")
+    search_results = bibtex_dblp.dblp_api.search_publication(search_string, max_search_results=max_search_results)
+    return search_results if search_results.total_matches else None
+
 
 # https://github.com/volkm/bibtex-dblp/blob/master/bin/update_from_dblp.py
 def search_dblp(search_string, include_arxiv=False, max_search_results=bibtex_dblp.config.MAX_SEARCH_RESULTS):
@@ -18,7 +28,9 @@ def search_dblp(search_string, include_arxiv=False, max_search_results=bibtex_db
     :raises: HTTPError.
     """
     logging.info("Search: {}".format(search_string))
-    search_results = bibtex_dblp.dblp_api.search_publication(search_string, max_search_results=max_search_results)
+    search_results = shared_cache().cached("dblp", title_key(search_string) + f"#{max_search_results}", _search_publication, search_string, max_search_results)
+    if search_results is None:
+        return [], 0
     if include_arxiv:
         return search_results.results, search_results.total_matches
     else:
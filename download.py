@@ -0,0 +1,136 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from metrics import count
+from ratelimit import KeyedRateLimiter
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0"
+}
+
+
+def sha256_file(p, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(p, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Downloader:
+    """
+    Streaming downloads over one pooled session, rate-limited per host; `workers` sizes the connection pool
+    for the threads calling `fetch` (the pipeline's download stage). Partial files are kept as `<name>.part` and resumed with a Range request,
+    finished files get a `<name>.sha256` sidecar ({"size", "sha256"}) so re-runs skip them.
+    """
+    def __init__(self, workers=8, per_host_rate=1.0, per_host_burst=4, timeout=(10, 120), chunk_size=1 << 16, retries=3):
+        self.timeout = timeout
+        self.chunk_size = chunk_size
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS)
+        adapter = HTTPAdapter(
+            pool_connections=workers, pool_maxsize=workers,
+            max_retries=Retry(total=retries, backoff_factor=1, status_forcelist=(429, 500, 502, 503, 504), respect_retry_after_header=True),
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.limiter = KeyedRateLimiter(per_host_rate, per_host_burst)
+
+    def _is_complete(self, p: Path, url):
+        sidecar = p.with_name(p.name + ".sha256")
+        if sidecar.exists():
+            try:
+                info = json.loads(sidecar.read_text())
+                return p.stat().st_size == info["size"] and sha256_file(p) == info["sha256"]
+            except Exception:
+                return False
+        # legacy download without sidecar, trust it if the size matches the server
+        self.limiter.acquire(urlparse(url).netloc)
+        try:
+            res = self.session.head(url, timeout=self.timeout, allow_redirects=True)
+            size = int(res.headers.get("Content-Length", -1))
+        except Exception:
+            return False
+        if size != p.stat().st_size:
+            return False
+        sidecar.write_text(json.dumps({"size": size, "sha256": sha256_file(p)}))
+        return True
+
+    def fetch(self, url, p):
+        p = Path(p)
+        if p.exists() and self._is_complete(p, url):
+            logging.debug(f"{p} exists, skip download")
+            count("download.skipped")
+            return p
+        part = p.with_name(p.name + ".part")
+        for _ in range(2):
+            offset = part.stat().st_size if part.exists() else 0
+            headers = {"Range": f"bytes={offset}-"} if offset else {}
+            if offset:
+                count("download.resumed")
+            self.limiter.acquire(urlparse(url).netloc)
+            try:
+                with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                    if response.status_code == 416:
+                        # stale .part larger than the file, start over
+                        part.unlink()
+                        continue
+                    if response.status_code not in (200, 206):
+                        logging.warning(f"Download {url} error: {response.status_code}")
+                        count("download.errors")
+                        return ""
+                    if response.status_code == 200:
+                        offset = 0
+                    with open(part, "ab" if offset else "wb") as f:
+                        for chunk in response.iter_content(self.chunk_size):
+                            f.write(chunk)
+                            count("download.bytes", len(chunk))
+                    if response.status_code == 206:
+                        total = response.headers.get("Content-Range", "").rpartition("/")[-1]
+                    elif "Content-Encoding" not in response.headers:
+                        total = response.headers.get("Content-Length")
+                    else:
+                        total = None
+            except requests.RequestException as e:
+                logging.warning(f"Download {url} interrupted at {part.stat().st_size if part.exists() else 0} bytes: {e}")
+                count("download.errors")
+                return ""
+            if total and total.isdigit() and part.stat().st_size != int(total):
+                logging.warning(f"Download {url} incomplete: {part.stat().st_size} of {total} bytes, will resume next time")
+                count("download.errors")
+                return ""
+            os.replace(part, p)
+            count("download.files")
+            p.with_name(p.name + ".sha256").write_text(json.dumps({"size": p.stat().st_size, "sha256": sha256_file(p)}))
+            return p
+        return ""
+
+    def discard(self, p):
+        """Deletes a downloaded file found to be broken, with its sidecar and partial download, so `fetch` starts over."""
+        p = Path(p)
+        for f in (p, p.with_name(p.name + ".sha256"), p.with_name(p.name + ".part")):
+            f.unlink(missing_ok=True)
+
+    def read(self, url):
+        """:return: the body of `url` (e.g. a reference PDF going straight to GROBID), None if it could not be fetched"""
+        self.limiter.acquire(urlparse(url).netloc)
+        try:
+            res = self.session.get(url, timeout=self.timeout)
+            res.raise_for_status()
+        except requests.RequestException as e:
+            logging.warning(f"Download {url} error: {e}")
+            count("download.errors")
+            return None
+        count("download.bytes", len(res.content))
+        return res.content
+
+    def shutdown(self):
+        self.session.close()
@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import os
+import threading
+
+from ratelimit import KeyedRateLimiter
+
+# requests per second (and burst) per remote service, IO_RATES="sscholar=1,zotero=5" overrides the rate
+DEFAULT_RATES = {
+    "sscholar": (1, 1),
+    "zotero": (5, 5),
+    "gscholar": (0.2, 1),
+    "dblp": (1, 1),
+    "arxiv": (1 / 3, 1),  # the API asks for one request every 3 seconds
+}
+
+
+class IOExecutor:
+    """
+    One long-lived thread pool for HTTP-bound work (reference resolution, ...), shared by every paper and
+    every SEARCH_QUERYS entry. `max_workers` is the global concurrency cap, `limit(service)` blocks
+    until the service's token bucket allows another request.
+    """
+    def __init__(self, max_workers=16, rates=None):
+        self.max_workers = max_workers
+        self.limiter = KeyedRateLimiter(0, rates={**DEFAULT_RATES, **(rates or {})})
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="io")
+
+    def submit(self, fn, *args, **kwargs):
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def limit(self, service):
+        self.limiter.acquire(service)
+
+    def set_rate(self, service, rate, burst=None):
+        """before the first `limit(service)`"""
+        base = service.partition(":")[0]
+        self.limiter.rates[service] = (rate, burst or DEFAULT_RATES.get(base, (0, 1))[1])
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_executor():
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            rates = {}
+            for kv in os.environ.get("IO_RATES", "").split(","):
+                if kv:
+                    name, rate = kv.split("=")
+                    rates[name] = (float(rate), DEFAULT_RATES.get(name, (0, 1))[1])
+            _shared = IOExecutor(int(os.environ.get("IO_WORKERS", 16)), rates)
+            logging.debug(f"IO executor: {_shared.max_workers} workers")
+        return _shared
+
+def rate_limit(service):
+    shared_executor().limit(service)
+
+def shutdown_shared(wait=True):
+    global _shared
+    with _shared_lock:
+        if _shared is not None:
+            _shared.shutdown(wait=wait)
+            _shared = None
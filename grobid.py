@@ -0,0 +1,147 @@
+import itertools
+import logging
+from pathlib import Path
+import threading
+import time
+
+import requests
+
+from metrics import count, timed
+
+# same form fields as `scipdf.parse_pdf(..., return_coordinates=True)`
+COORDINATES = [("teiCoordinates", (None, t)) for t in ("persName", "figure", "ref", "formula", "biblStruct")]
+
+
+class Endpoint:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.alive = None
+        self.checked_at = 0.
+        self.outstanding = 0
+        self.failures = 0
+        self.open_until = 0.
+
+    def __repr__(self):
+        return f"Endpoint({self.url}, alive={self.alive}, outstanding={self.outstanding}, failures={self.failures})"
+
+
+class GrobidPool:
+    """
+    Spreads PDFs over several GROBID servers.
+    Health (`/api/isalive`) is cached for `health_ttl` seconds, each PDF goes to the healthy server with the least
+    outstanding requests, and a server is skipped for `cooldown` seconds after `max_failures` consecutive
+    timeouts / `[GENERAL]` exceptions. A failed PDF is retried on the next server.
+    PDF URLs are fetched through `downloader` (a `download.Downloader`) when given, under its per-host rate limit.
+    """
+    def __init__(self, urls, health_ttl=300, cooldown=600, max_failures=2, timeout=(10, 300), downloader=None):
+        self.endpoints = [Endpoint(u) for u in urls if u.strip()]
+        self.health_ttl = health_ttl
+        self.cooldown = cooldown
+        self.max_failures = max_failures
+        self.timeout = timeout
+        self.downloader = downloader
+        self.session = requests.Session()
+        self._lock = threading.Lock()
+        self._rr = itertools.count()
+
+    def is_alive(self, ep: Endpoint, force=False):
+        if not force and time.monotonic() - ep.checked_at < self.health_ttl:
+            return ep.alive
+        try:
+            ep.alive = self.session.get(ep.url + "/api/isalive", timeout=self.timeout[0]).text == "true"
+        except requests.RequestException:
+            ep.alive = False
+        ep.checked_at = time.monotonic()
+        return ep.alive
+
+    def check_all(self):
+        for ep in self.endpoints:
+            if not self.is_alive(ep, force=True):
+                logging.warning("Error: " + ep.url + " is not alive")
+        return [ep for ep in self.endpoints if ep.alive]
+
+    def _acquire(self, tried):
+        now = time.monotonic()
+        with self._lock:
+            candidates = [ep for ep in self.endpoints if ep not in tried and ep.open_until <= now]
+            # rotate so ties do not always land on the first server
+            shift = next(self._rr) % max(1, len(candidates))
+            candidates = candidates[shift:] + candidates[:shift]
+            candidates.sort(key=lambda ep: ep.outstanding)
+        for ep in candidates:
+            if self.is_alive(ep):
+                with self._lock:
+                    ep.outstanding += 1
+                return ep
+            tried.add(ep)
+        return None
+
+    def _release(self, ep: Endpoint, ok):
+        with self._lock:
+            ep.outstanding -= 1
+            if ok:
+                ep.failures = 0
+                return
+            ep.failures += 1
+            if ep.failures >= self.max_failures:
+                logging.warning(f"GROBID {ep.url} failed {ep.failures} times, skip it for {self.cooldown}s")
+                ep.open_until = time.monotonic() + self.cooldown
+                ep.checked_at = 0.
+
+    def load(self, pdf):
+        """
+        :param pdf: path, `.pdf` URL or bytes
+        :return: the PDF bytes, or None if the URL could not be fetched
+        """
+        if isinstance(pdf, bytes):
+            return pdf
+        if isinstance(pdf, str) and pdf.startswith(("http://", "https://")):
+            if self.downloader is not None:
+                return self.downloader.read(pdf)
+            try:
+                res = self.session.get(pdf, timeout=self.timeout)
+                res.raise_for_status()
+            except requests.RequestException as e:
+                logging.warning(f"Fetch {pdf} for GROBID: {e}")
+                return None
+            return res.content
+        return Path(pdf).read_bytes()
+
+    def process(self, pdf, fulltext=True, return_coordinates=True):
+        """
+        :param pdf: path, `.pdf` URL or bytes
+        :return: TEI XML text, or None if no server could parse it
+        """
+        pdf = self.load(pdf)
+        if pdf is None:
+            return None
+        api = "/api/processFulltextDocument" if fulltext else "/api/processHeaderDocument"
+        files = [("input", pdf)] + (COORDINATES if return_coordinates else [])
+
+        tried = set()
+        while True:
+            ep = self._acquire(tried)
+            if ep is None:
+                count("grobid.failed")
+                return None
+            if tried:
+                count("grobid.retries")
+            tried.add(ep)
+            count("grobid.bytes", len(pdf))
+            try:
+                with timed("grobid.request"):
+                    res = self.session.post(ep.url + api, files=files, timeout=self.timeout)
+            except requests.RequestException as e:
+                logging.debug(f"GROBID {ep.url}: {e}")
+                self._release(ep, ok=False)
+                continue
+            if res.status_code == 204 or res.text.startswith("[NO_BLOCKS]"):
+                # the PDF itself is empty, another server will not do better
+                self._release(ep, ok=True)
+                return None
+            if res.status_code != 200 or ("[GENERAL]" in res.text and "exception" in res.text):
+                logging.debug(f"GROBID {ep.url}: {res.status_code} {res.text[:200]}")
+                self._release(ep, ok=False)
+                continue
+            self._release(ep, ok=True)
+            return res.text
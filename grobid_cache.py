@@ -0,0 +1,112 @@
+import gzip
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+import sqlite3
+import threading
+import time
+
+from metrics import count
+
+
+class ParseCache:
+    """
+    Content-addressed cache of GROBID results: `<root>/<kk>/<key>.tei.gz` holds the TEI XML and
+    `<key>.json.gz` the structures derived from it. The key is sha256(pdf bytes) + GROBID options.
+    The derived structures are stored with the `schema` of the parser that made them; one of another schema
+    (a different TEI parser, new fields) is not served, its TEI can be parsed again instead of asking GROBID.
+    Entries are evicted least-recently-used once the cache grows over `max_bytes`.
+    With `refresh=True` nothing is read, but fresh results are still written.
+    """
+    def __init__(self, root, max_bytes=2 << 30, refresh=False, schema=""):
+        self.root = Path(root)
+        self.root.mkdir(exist_ok=True, parents=True)
+        self.max_bytes = max_bytes
+        self.refresh = refresh
+        self.schema = schema
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.root / "index.sqlite", check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, size INTEGER NOT NULL, atime REAL NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime)")
+        self._conn.commit()
+
+    @staticmethod
+    def key(pdf: bytes, **options):
+        h = hashlib.sha256(pdf)
+        h.update(json.dumps(options, sort_keys=True).encode())
+        return h.hexdigest()
+
+    def _path(self, key, suffix):
+        return self.root / key[:2] / (key + suffix)
+
+    def _touch(self, key):
+        with self._lock:
+            self._conn.execute("UPDATE entries SET atime = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+    def get(self, key):
+        """:return: the derived structures, None if there are none of the current `schema`"""
+        if self.refresh:
+            return None
+        try:
+            with gzip.open(self._path(key, ".json.gz"), "rt") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            count("grobid_cache.miss")
+            return None
+        # entries written before the schema was recorded are plain derived dicts
+        if not isinstance(entry, dict) or entry.get("schema") != self.schema or "derived" not in entry:
+            count("grobid_cache.stale")
+            return None
+        count("grobid_cache.hit")
+        self._touch(key)
+        return entry["derived"]
+
+    def get_tei(self, key):
+        """:return: the cached TEI XML or None, for re-deriving an entry `get` found stale"""
+        if self.refresh:
+            return None
+        try:
+            with gzip.open(self._path(key, ".tei.gz"), "rt") as f:
+                tei = f.read()
+        except (OSError, ValueError):
+            return None
+        count("grobid_cache.tei_hit")
+        self._touch(key)
+        return tei
+
+    def put(self, key, tei, derived):
+        self._path(key, "").parent.mkdir(exist_ok=True)
+        size = 0
+        for suffix, payload in ((".tei.gz", tei), (".json.gz", json.dumps({"schema": self.schema, "derived": derived}))):
+            p = self._path(key, suffix)
+            tmp = p.with_name(p.name + f".{threading.get_ident()}.tmp")
+            with gzip.open(tmp, "wt") as f:
+                f.write(payload)
+            os.replace(tmp, p)
+            size += p.stat().st_size
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO entries VALUES (?, ?, ?)", (key, size, time.time()))
+            self._conn.commit()
+        self.evict()
+
+    def evict(self):
+        with self._lock:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+            if total <= self.max_bytes:
+                return
+            victims = []
+            for key, size in self._conn.execute("SELECT key, size FROM entries ORDER BY atime"):
+                if total <= self.max_bytes:
+                    break
+                victims.append(key)
+                total -= size
+            self._conn.executemany("DELETE FROM entries WHERE key = ?", ((k,) for k in victims))
+            self._conn.commit()
+        for key in victims:
+            for suffix in (".tei.gz", ".json.gz"):
+                self._path(key, suffix).unlink(missing_ok=True)
+        logging.info(f"GROBID cache evicted {len(victims)} entries")
@@ -1,7 +1,16 @@
 from typing import OrderedDict
+import time
 
 from scholarly import scholarly
 
+from executor import rate_limit
+from lookup_cache import shared_cache, title_key
+
+
+def search_pubs(title):
+    rate_limit("gscholar")
+    return list(scholarly.search_pubs(title)) or None
+
 
 def retrieve_info(article, zot):
     # template = zot.item_template('journalArticle')
@@ -15,8 +24,8 @@ def retrieve_info(article, zot):
     template["conferenceName"] = article["journal"]
     template["proceedingsTitle"] = article["journal"]
 
-    search_query = list(scholarly.search_pubs(article["title"]))
-    if len(search_query) == 0:
+    search_query = shared_cache().cached("gscholar", title_key(article["title"]), search_pubs, article["title"])
+    if not search_query:
         return template
     
     article = list(filter(lambda x: "arxiv" not in x["pub_url"], search_query))
@@ -0,0 +1,138 @@
+import datetime
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+import arxiv
+
+# papers can show up late in submittedDate order (moderation, holds), so look a bit below the high-water mark
+OVERLAP = datetime.timedelta(days=2)
+STALE = 30 * 24 * 3600  # forget queries not run for a month (e.g. yesterday's RSS id_list)
+
+
+def query_key(name, collection, search_query):
+    digest = hashlib.sha1(json.dumps(search_query, sort_keys=True).encode()).hexdigest()[:10]
+    return f"{name}/{collection}/{digest}"
+
+
+class HarvestState:
+    """
+    Per-query progress kept between runs, in a JSON file:
+    `high_water` is the newest `published` timestamp already ingested, `seen` the entry ids (-> published) inside
+    the overlap window below it, and `backfill_offset` how far the backfill walked into older pages.
+    Id listings (RSS, id lists) also keep `listed`, the ids they ingested (-> when), for STALE seconds.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.queries = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.queries = json.load(f)
+
+    def get(self, key):
+        return self.queries.setdefault(key, {"high_water": None, "seen": {}, "backfill_offset": 0})
+
+    def save(self):
+        now = time.time()
+        self.queries = {k: v for k, v in self.queries.items() if now - v.get("touched", now) < STALE}
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.queries, f, indent=1)
+        os.replace(tmp, self.path)
+
+    def new_results(self, client, key, search_query, max_results):
+        """
+        Newest-first results of the query that were not ingested yet.
+        Paging stops at the first result below the high-water mark (minus OVERLAP).
+        """
+        state = self.get(key)
+        high_water = datetime.datetime.fromisoformat(state["high_water"]) if state["high_water"] else None
+        seen = state["seen"]
+        results = client.results(arxiv.Search(
+            max_results=max_results,
+            sort_by=arxiv.SortCriterion.SubmittedDate,
+            sort_order=arxiv.SortOrder.Descending,
+            **search_query
+        ))
+        fresh = []
+        for result in results:
+            if high_water is not None and result.published < high_water - OVERLAP:
+                break
+            if result.get_short_id() in seen:
+                continue
+            fresh.append(result)
+        logging.info(f"{key}: {len(fresh)} new results since {state['high_water']}")
+        return fresh
+
+    def listed_results(self, client, key, ids):
+        """
+        The results of an explicit id list (RSS listings, ad-hoc ids) that were not ingested yet. No high-water
+        break as in `new_results`: a listing also carries replaced and cross-listed papers published long ago.
+        """
+        # no entry is created for a list nobody marks (ad-hoc ids)
+        state = self.queries.get(key, {})
+        seen = {re.sub(r"v\d+$", "", i) for i in state.get("seen", {})} | set(state.get("listed", {}))
+        ids = [i for i in ids if re.sub(r"v\d+$", "", i) not in seen]
+        results = list(client.results(arxiv.Search(id_list=ids, max_results=len(ids)))) if ids else []
+        logging.info(f"{key}: {len(results)} listed results not seen yet")
+        return results
+
+    def backfill_results(self, client, key, search_query, max_results):
+        """The next `max_results` older results, continuing from the stored cursor."""
+        state = self.get(key)
+        results = client.results(arxiv.Search(
+            max_results=state["backfill_offset"] + max_results,
+            sort_by=arxiv.SortCriterion.SubmittedDate,
+            sort_order=arxiv.SortOrder.Descending,
+            **search_query
+        ), offset=state["backfill_offset"])
+        results = list(results)
+        logging.info(f"{key}: backfill {len(results)} results from offset {state['backfill_offset']}")
+        return results
+
+    def mark(self, key, results, backfill=False, listed=False):
+        """
+        Records `results` as ingested, call after they were processed successfully.
+        :param listed: the results of an id listing, see `listed_results`
+        """
+        state = self.get(key)
+        now = state["touched"] = time.time()
+        if listed:
+            # the old papers a listing carries fall below the overlap window of `seen` at once
+            state["listed"] = {i: t for i, t in state.get("listed", {}).items() if now - t < STALE}
+            state["listed"].update((re.sub(r"v\d+$", "", r.get_short_id()), now) for r in results)
+        if backfill:
+            state["backfill_offset"] += len(results)
+        if not results:
+            return
+        newest = max(r.published for r in results)
+        high_water = datetime.datetime.fromisoformat(state["high_water"]) if state["high_water"] else None
+        if high_water is None or newest > high_water:
+            high_water = newest
+            state["high_water"] = newest.isoformat()
+        seen = {**state["seen"], **{r.get_short_id(): r.published.isoformat() for r in results}}
+        # ids only matter inside the overlap window
+        state["seen"] = {k: v for k, v in seen.items() if datetime.datetime.fromisoformat(v) >= high_water - OVERLAP}
+
+
+def plan(fetched):
+    """
+    Merges the results of all queries by arXiv id, so a paper matched by several queries is downloaded,
+    parsed and written once.
+    :param fetched: [(name, collection, tags, results)]
+    :return: unique results in first-seen order, {arxiv id: {"names", "collections", "tags"}}
+    """
+    unique, assignments = {}, {}
+    for name, collection, tags, results in fetched:
+        for result in results:
+            aid = re.sub(r"v\d+$", "", result.get_short_id())
+            unique.setdefault(aid, result)
+            assignment = assignments.setdefault(aid, {"names": [], "collections": [], "tags": []})
+            for field, values in (("names", [name]), ("collections", [collection]), ("tags", tags)):
+                assignment[field].extend(v for v in values if v not in assignment[field])
+    total = sum(len(results) for *_, results in fetched)
+    logging.info(f"Planned {len(unique)} unique papers from {total} results of {len(fetched)} queries")
+    return list(unique.values()), assignments
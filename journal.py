@@ -0,0 +1,118 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# steps of one arXiv paper in update_by_arxiv, in order; "linked" papers are finished and dropped from the journal
+STATES = ("planned", "downloaded", "parsed", "resolved", "item_created", "note_created", "linked")
+
+
+def reached(entry, state):
+    return entry is not None and STATES.index(entry["state"]) >= STATES.index(state)
+
+
+class Journal:
+    """
+    Durable per-paper progress of update_by_arxiv, keyed by arXiv id (without version).
+    Each entry holds its last completed state plus what later steps need to resume from there:
+    pdf_path / collections / tags when planned, the item metadata (with its pre-assigned zotero keys) once parsed,
+    the resolved references, and the created item and note.
+    Runs on an unfinished paper back off: after its n-th run the next one waits `retry_after * 2 ** (n - 1)`
+    seconds, so a short outage of GROBID / Zotero costs few attempts however often the daemon runs.
+    A paper still unfinished after `max_attempts` runs is abandoned; it stays in the journal, marked, and is
+    neither resumed nor planned again until the abandonment expires after `abandon_ttl` seconds.
+    """
+    def __init__(self, path, max_attempts=None, retry_after=None, abandon_ttl=None):
+        self.path = path
+        self.max_attempts = max_attempts or int(os.environ.get("JOURNAL_MAX_ATTEMPTS", 3))
+        self.retry_after = retry_after or float(os.environ.get("JOURNAL_RETRY_AFTER", 900))
+        self.abandon_ttl = abandon_ttl or float(os.environ.get("JOURNAL_ABANDON_TTL", 7 * 24 * 3600))
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS papers (aid TEXT PRIMARY KEY, state TEXT, data TEXT, updated REAL)")
+        self._conn.commit()
+
+    def get(self, aid):
+        """:return: {"state": ..., **data} or None"""
+        with self._lock:
+            row = self._conn.execute("SELECT state, data FROM papers WHERE aid = ?", (aid,)).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row[1]), "state": row[0]}
+
+    def advance(self, aid, state, **data):
+        """Records `state` as completed, merging `data` into the entry."""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM papers WHERE aid = ?", (aid,)).fetchone()
+            merged = {**(json.loads(row[0]) if row else {}), **data}
+            self._conn.execute("INSERT OR REPLACE INTO papers VALUES (?, ?, ?, ?)", (aid, state, json.dumps(merged), time.time()))
+            self._conn.commit()
+        logging.debug(f"Journal {aid}: {state}")
+
+    def _update(self, aid, **data):
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM papers WHERE aid = ?", (aid,)).fetchone()
+            if row is None:
+                return {}
+            merged = {**json.loads(row[0]), **data}
+            self._conn.execute("UPDATE papers SET data = ? WHERE aid = ?", (json.dumps(merged), aid))
+            self._conn.commit()
+        return merged
+
+    def _due(self, data, updated, now):
+        """
+        :return: "run" if a run may work on the paper now, "abandon" if it ran out of attempts,
+            "wait" while it backs off or stays abandoned
+        """
+        if data.get("abandoned"):
+            # a float since abandonment expires, True in older journals
+            if data["abandoned"] is True or now - data["abandoned"] < self.abandon_ttl:
+                return "wait"
+            return "run"
+        attempts = data.get("attempts", 1)
+        if now - data.get("last_attempt", updated) < self.retry_after * 2 ** (attempts - 1):
+            return "wait"
+        return "abandon" if attempts >= self.max_attempts else "run"
+
+    def attempt(self, aid):
+        """
+        Starts another run on the paper when it is due, see `_due`; an abandonment that expired starts a new
+        round of `max_attempts` runs.
+        :return: ("run" | "wait" | "abandon", the number of runs so far, the first one included)
+        """
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT data, updated FROM papers WHERE aid = ?", (aid,)).fetchone()
+        if row is None:
+            return "run", 1
+        data = json.loads(row[0])
+        due = self._due(data, row[1], now)
+        attempts = data.get("attempts", 1)
+        if due == "abandon":
+            self._update(aid, abandoned=now)
+        elif due == "run":
+            attempts = 1 if data.get("abandoned") else attempts + 1
+            self._update(aid, attempts=attempts, last_attempt=now, abandoned=None)
+        return due, attempts
+
+    def done(self, aid):
+        with self._lock:
+            self._conn.execute("DELETE FROM papers WHERE aid = ?", (aid,))
+            self._conn.commit()
+
+    def pending(self):
+        """
+        :return: {arXiv id: state} of the papers an earlier run left unfinished and that are due for another run
+            (or for being abandoned), without those backing off
+        """
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute("SELECT aid, state, data, updated FROM papers ORDER BY updated").fetchall()
+        return {aid: state for aid, state, data, updated in rows if self._due(json.loads(data), updated, now) != "wait"}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
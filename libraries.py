@@ -0,0 +1,135 @@
+"""
+The zotero libraries one run syncs. Without a config, the single library of USER_ID / GROUP_ID / ZOTERO_KEY;
+with LIBRARIES=libraries.json, every library listed there:
+
+    {"libraries": [
+        {"name": "sjtu", "group_id": "5262725", "api_key_env": "ZOTERO_KEY_SJTU", "ref_collection": "MKR87F5B",
+         "collections": {"ARXIV_ASR": "IDRMFRCT", "ARXIV_SD_AS": "3F7GENNZ"}, "tags": {"ARXIV_ASR": ["asr"]}},
+        {"name": "lab2", "user_id": "123456", "api_key": "...", "ref_collection": "ABCD1234",
+         "collections": {"ARXIV_ASR": "EFGH5678"}, "zotero_rate": 2}
+    ]}
+
+`collections` maps the names of the sources in search.py to the library's collection keys, a library only gets
+the sources it lists. Each library keeps its LOCAL_DB, library mirror, journal and citation graph in its own
+`state_dir` (default LIBRARY_STATE_ROOT/<name>) and its own zotero rate limit; downloads, GROBID parses and
+resolver lookups are shared.
+"""
+import json
+import logging
+import os
+from pathlib import Path
+
+from executor import shared_executor
+from localdb import open_db
+
+
+class Library:
+    def __init__(self, name, api_key, library_id, library_type="group", ref_collection="MKR87F5B", collections=None, tags=None,
+                 zotero_rate=None, state_dir=".", local_db=None, paths=None, endpoint=None):
+        """
+        :param collections: source name -> collection key, None for every source with the collection it declares
+        :param tags: source name -> extra tags
+        :param local_db: an open LocalDB to use instead of `state_dir`/LOCAL_DB.sqlite
+        :param paths: overrides of the state file paths, {"mirror", "journal", "citegraph"}
+        :param endpoint: zotero API base URL, default ZOTERO_ENDPOINT or api.zotero.org
+        """
+        self.name = name
+        self.api_key = api_key
+        self.library_id, self.library_type = str(library_id), library_type
+        self.ref_collection = ref_collection
+        self.collections = collections
+        self.tags = tags or {}
+        self.zotero_rate = zotero_rate
+        self.endpoint = endpoint or os.environ.get("ZOTERO_ENDPOINT")
+        self.state_dir = Path(state_dir)
+        self.paths = {
+            "mirror": str(self.state_dir / "LIBRARY_MIRROR.json.gz"),
+            "journal": str(self.state_dir / "JOURNAL.sqlite"),
+            "citegraph": str(self.state_dir / "CITEGRAPH"),
+            **(paths or {}),
+        }
+        self.zot = self.local_db = self.mirror = self.journal = self.citegraph = None
+        self._own_db = local_db is None
+        self.local_db = local_db
+
+    def __repr__(self):
+        return f"Library({self.name}: {self.library_type} {self.library_id})"
+
+    @classmethod
+    def from_env(cls, local_db):
+        """the single library of the environment, with the state file names of a one-library run"""
+        user_id = os.environ.get("USER_ID")
+        return cls(
+            "default", os.environ["ZOTERO_KEY"], user_id or os.environ["GROUP_ID"], "user" if user_id else "group",
+            ref_collection=os.environ.get("REF_COLLECTION", "MKR87F5B"), local_db=local_db,
+            paths={
+                "mirror": os.environ.get("LIBRARY_MIRROR", "LIBRARY_MIRROR.json.gz"),
+                "journal": os.environ.get("JOURNAL", "JOURNAL.sqlite"),
+                "citegraph": os.environ.get("CITEGRAPH", "CITEGRAPH"),
+            },
+        )
+
+    @property
+    def rate_service(self):
+        """rate limit key of the library's zotero requests, inheriting the "zotero" rate unless `zotero_rate` is set"""
+        return f"zotero:{self.name}"
+
+    def subscribes(self, source):
+        return self.collections is None or source.name in self.collections
+
+    def assignment(self, source):
+        """(collection, tags) the library files the results of `source` under"""
+        collection = source.collection if self.collections is None else self.collections[source.name]
+        return collection, source.tags + [t for t in self.tags.get(source.name, []) if t not in source.tags]
+
+    def open(self):
+        from pyzotero import zotero
+
+        from citegraph import CitationGraph
+        from journal import Journal
+        from library import LibraryMirror
+
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.zot = zotero.Zotero(self.library_id, self.library_type, self.api_key)
+        if self.endpoint:
+            self.zot.endpoint = self.endpoint.rstrip("/")
+        self.zot.rate_service = self.rate_service
+        if self.zotero_rate is not None:
+            shared_executor().set_rate(self.rate_service, float(self.zotero_rate))
+        if self.local_db is None:
+            self.local_db = open_db(str(self.state_dir / "LOCAL_DB.sqlite"))
+        self.mirror = LibraryMirror(self.zot, self.paths["mirror"])
+        self.journal = Journal(self.paths["journal"])
+        self.citegraph = CitationGraph(self.paths["citegraph"])
+        return self
+
+    def save(self):
+        self.local_db.commit()
+        self.mirror.save()
+        self.citegraph.save()
+
+    def close(self):
+        self.journal.close()
+        self.citegraph.close()
+        if self._own_db:
+            self.local_db.close()
+
+
+def load_libraries(path):
+    with open(path) as f:
+        config = json.load(f)
+    root = Path(os.environ.get("LIBRARY_STATE_ROOT", "libraries"))
+    libraries = []
+    for entry in config["libraries"]:
+        api_key = entry.get("api_key") or os.environ[entry.get("api_key_env", "ZOTERO_KEY")]
+        library_type = "user" if entry.get("user_id") else "group"
+        libraries.append(Library(
+            entry["name"], api_key, entry.get("user_id") or entry["group_id"], library_type,
+            ref_collection=entry["ref_collection"], collections=entry.get("collections"), tags=entry.get("tags"),
+            zotero_rate=entry.get("zotero_rate"), state_dir=entry.get("state_dir", root / entry["name"]), endpoint=entry.get("endpoint"),
+        ))
+    names = [lib.name for lib in libraries]
+    if len(set(names)) != len(names):
+        raise ValueError(f"Duplicate library names in {path}: {names}")
+    logging.info(f"{len(libraries)} libraries from {path}: {', '.join(names)}")
+    return libraries
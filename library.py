@@ -0,0 +1,139 @@
+import gzip
+import json
+import logging
+import os
+import threading
+
+from localdb import arxiv_id, normalize_title
+from titleindex import TitleIndex
+
+# only what dedup / relation updates need, full items are too big for 100k+ libraries
+KEEP_FIELDS = ("key", "version", "itemType", "title", "DOI", "url", "extra", "archiveID", "archiveLocation", "relations")
+
+
+def slim(item):
+    return {
+        "key": item["key"],
+        "version": item.get("version", item["data"].get("version", 0)),
+        "library": item.get("library", {}),
+        "data": {k: item["data"][k] for k in KEEP_FIELDS if k in item["data"]},
+    }
+
+
+class LibraryMirror:
+    """
+    Local copy of the zotero library, answering title/DOI/arXiv existence checks in memory.
+    The first `sync` pulls everything, later ones only what changed `since` the stored library version.
+    """
+    def __init__(self, zot, path):
+        self.zot = zot
+        self.path = path
+        self.version = None
+        self.items = {}
+        self._lock = threading.RLock()
+        self._by_title, self._by_doi, self._by_arxiv = {}, {}, {}
+        self._fuzzy = None  # built on the first title that has no exact match
+        if os.path.exists(path):
+            try:
+                with gzip.open(path, "rt") as f:
+                    snapshot = json.load(f)
+                self.version = snapshot["version"]
+                for item in snapshot["items"]:
+                    self._index(item)
+            except Exception as e:
+                logging.warning(f"Drop broken library snapshot {path}: {e}")
+                self.version, self.items = None, {}
+                self._by_title, self._by_doi, self._by_arxiv = {}, {}, {}
+
+    @staticmethod
+    def _keys(item):
+        data = item["data"]
+        title = normalize_title(data["title"]) if data.get("title") else ""
+        doi = (data.get("DOI") or "").lower()
+        aid = arxiv_id(data.get("archiveID")) or arxiv_id(data.get("extra")) or arxiv_id(data.get("url"))
+        return title, doi, aid
+
+    def _index(self, item):
+        if item["data"].get("itemType") in ("note", "attachment", "annotation"):
+            return
+        self.items[item["key"]] = item
+        for index, k in zip((self._by_title, self._by_doi, self._by_arxiv), self._keys(item)):
+            if k:
+                index[k] = item
+        if self._fuzzy is not None:
+            self._fuzzy.add(item["key"], item["data"].get("title", ""))
+
+    def _unindex(self, key):
+        item = self.items.pop(key, None)
+        if item is None:
+            return
+        for index, k in zip((self._by_title, self._by_doi, self._by_arxiv), self._keys(item)):
+            if k and index.get(k) is item:
+                del index[k]
+        if self._fuzzy is not None:
+            self._fuzzy.remove(key)
+
+    def sync(self):
+        version = self.zot.last_modified_version()
+        with self._lock:
+            if self.version is None:
+                items = self.zot.everything(self.zot.items())
+                deleted = []
+            elif version == self.version:
+                return 0
+            else:
+                items = self.zot.everything(self.zot.items(since=self.version))
+                deleted = self.zot.deleted(since=self.version).get("items", [])
+            for key in deleted:
+                self._unindex(key)
+            for item in items:
+                self._unindex(item["key"])
+                self._index(slim(item))
+            logging.info(f"Library mirror synced {self.version} -> {version}: {len(items)} changed, {len(deleted)} deleted, {len(self.items)} total")
+            self.version = version
+            self.save()
+            return len(items)
+
+    def save(self):
+        with self._lock:
+            tmp = self.path + ".tmp"
+            with gzip.open(tmp, "wt") as f:
+                json.dump({"version": self.version, "items": list(self.items.values())}, f)
+            os.replace(tmp, self.path)
+
+    def add(self, item):
+        # items we create ourselves, so they are visible before the next sync
+        with self._lock:
+            self._unindex(item["key"])
+            self._index(slim(item))
+
+    def find_title(self, title, fuzzy=True):
+        item = self._by_title.get(normalize_title(title))
+        if item is None and fuzzy:
+            # the same title with OCR / hyphenation / citation style differences
+            item = self.items.get(self.fuzzy_index().match(title)[0])
+        return item
+
+    def fuzzy_index(self):
+        with self._lock:
+            if self._fuzzy is None:
+                self._fuzzy = TitleIndex()
+                self._fuzzy.add_many((key, item["data"].get("title", ""), "", "") for key, item in self.items.items())
+                logging.info(f"Fuzzy title index of {len(self._fuzzy)} items built")
+            return self._fuzzy
+
+    def find_doi(self, doi):
+        return self._by_doi.get(doi.lower()) if doi else None
+
+    def find_arxiv(self, text):
+        aid = arxiv_id(text)
+        return self._by_arxiv.get(aid) if aid else None
+
+    def find(self, title="", doi="", arxiv=""):
+        """item with the DOI, else the arXiv id, else the (fuzzy) title"""
+        return self.find_doi(doi) or self.find_arxiv(arxiv) or (self.find_title(title) if title else None)
+
+    def query_title(self, title, doi="", arxiv=""):
+        # same shape as the `zot.items(q=...)` based lookup
+        item = self.find(title, doi, arxiv)
+        return {title.lower(): item} if item is not None else {}
@@ -0,0 +1,174 @@
+import logging
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+
+
+# an id in running text (url / extra / archiveID) only counts with arXiv context, so DOIs such as
+# 10.1109/ICASSP40776.2020.9054250 do not yield fake ids
+ARXIV_ID_RE = re.compile(r"(?:arxiv\.org/(?:abs|pdf)/|\barxiv:\s*|10\.48550/arxiv\.)(\d{4}\.\d{4,5})(?:v\d+)?\b", re.I)
+BARE_ARXIV_ID_RE = re.compile(r"\s*(\d{4}\.\d{4,5})(?:v\d+)?\s*")
+
+
+def arxiv_id(text):
+    """the id in "2310.17558v1", "arXiv:2310.17558v1 [cs.SD]", an arxiv.org/abs|pdf URL or an arXiv DOI; empty if there is none"""
+    m = BARE_ARXIV_ID_RE.fullmatch(text or "") or ARXIV_ID_RE.search(text or "")
+    return m.group(1) if m else ""
+
+
+def normalize_title(title):
+    # lowercase, strip accents / latex / punctuation, collapse whitespace
+    if not title.isascii():
+        title = unicodedata.normalize("NFKD", title)
+        title = "".join(c for c in title if not unicodedata.combining(c))
+    title = re.sub(r"\\[a-zA-Z]+|[{}$]", " ", title.lower())
+    title = re.sub(r"[^a-z0-9]+", " ", title)
+    return " ".join(title.split())
+
+
+class LocalDB:
+    """
+    Title -> zotero key store. Lookups go through the normalized title.
+    `add` is buffered until `commit`, which is called once per collection run.
+    """
+    def __contains__(self, title):
+        return self.get(title) is not None
+
+    def __getitem__(self, title):
+        key = self.get(title)
+        if key is None:
+            raise KeyError(title)
+        return key
+
+    def get(self, title, default=None):
+        raise NotImplementedError
+
+    def add(self, title, key):
+        raise NotImplementedError
+
+    def commit(self):
+        pass
+
+    def close(self):
+        self.commit()
+
+
+class SqliteDB(LocalDB):
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level="DEFERRED")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS papers (title TEXT PRIMARY KEY, norm TEXT NOT NULL, key TEXT NOT NULL)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS papers_norm ON papers (norm)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value TEXT)")
+        self._conn.commit()
+
+    def get(self, title, default=None):
+        with self._lock:
+            row = self._conn.execute("SELECT key FROM papers WHERE norm = ? LIMIT 1", (normalize_title(title),)).fetchone()
+        return row[0] if row else default
+
+    def add(self, title, key):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO papers VALUES (?, ?, ?)", (title, normalize_title(title), key))
+
+    def add_many(self, pairs):
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO papers VALUES (?, ?, ?)", ((t, normalize_title(t), k) for t, k in pairs))
+
+    def commit(self):
+        with self._lock:
+            self._conn.commit()
+
+    def close(self):
+        self.commit()
+        self._conn.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+    def items(self):
+        with self._lock:
+            return self._conn.execute("SELECT title, key FROM papers").fetchall()
+
+    def meta(self, name, value=None):
+        """reads `name`, or sets it when `value` is given; like `add`, a write is buffered until `commit`"""
+        with self._lock:
+            if value is not None:
+                self._conn.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (name, str(value)))
+                return value
+            row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def migrate_tsv(self, tsv_path):
+        # one-shot import of the legacy `title\tkey` file
+        if not os.path.exists(tsv_path) or self.meta("migrated:" + tsv_path):
+            return 0
+        pairs = list(read_tsv(tsv_path))
+        # the entries and the marker in one transaction
+        self.add_many(pairs)
+        self.meta("migrated:" + tsv_path, len(pairs))
+        self.commit()
+        logging.info(f"Migrated {len(pairs)} entries from {tsv_path} to {self.path}")
+        return len(pairs)
+
+
+class TsvDB(LocalDB):
+    """Legacy append-only TSV, kept in memory; appends are flushed on `commit`."""
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._index = {}
+        self._pending = []
+        if os.path.exists(path):
+            for title, key in read_tsv(path):
+                self._index[normalize_title(title)] = key
+
+    def get(self, title, default=None):
+        return self._index.get(normalize_title(title), default)
+
+    def add(self, title, key):
+        with self._lock:
+            self._index[normalize_title(title)] = key
+            self._pending.append((title, key))
+
+    def commit(self):
+        with self._lock:
+            if not self._pending:
+                return
+            with open(self.path, "a") as f:
+                f.write("".join(f"{t}\t{k}\n" for t, k in self._pending))
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending = []
+
+    def __len__(self):
+        return len(self._index)
+
+
+def read_tsv(path):
+    with open(path, "r") as f:
+        for lineno, l in enumerate(f, 1):
+            parts = l.rstrip("\n").split("\t")
+            # torn / partial lines from an interrupted write
+            if len(parts) != 2 or not parts[0] or not parts[1]:
+                logging.warning(f"{path}:{lineno} skip malformed line: {l!r}")
+                continue
+            yield parts[0], parts[1]
+
+
+BACKENDS = {
+    "sqlite": SqliteDB,
+    "tsv": TsvDB,
+}
+
+def open_db(path, backend="sqlite", legacy_tsv=None):
+    db = BACKENDS[backend](path)
+    if legacy_tsv and isinstance(db, SqliteDB):
+        db.migrate_tsv(legacy_tsv)
+    return db
@@ -0,0 +1,103 @@
+from collections import Counter
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from localdb import normalize_title
+
+DAY = 24 * 3600
+# how long an answer of each source stays valid, and how long "not found" is remembered
+DEFAULT_TTLS = {
+    "sscholar": 30 * DAY,
+    "dblp": 30 * DAY,
+    "gscholar": 14 * DAY,
+}
+NEGATIVE_TTL = 3 * DAY
+MISS = object()
+
+
+def title_key(title):
+    return "title:" + normalize_title(title)
+
+
+def id_key(kind, value):
+    return kind.lower() + ":" + value.strip().lower()
+
+
+class LookupCache:
+    """
+    Remote metadata lookups by (source, key), shared by sscholar / dblp / gscholar.
+    Keys are `title_key(...)` or `id_key("doi", ...)`; a stored None means "not found" (negative entry).
+    """
+    def __init__(self, path, ttls=None, negative_ttl=NEGATIVE_TTL):
+        self.path = path
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.negative_ttl = negative_ttl
+        self.stats = Counter()
+        self._reported = Counter()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS lookups (source TEXT, key TEXT, value BLOB, found INTEGER, fetched REAL, PRIMARY KEY (source, key))")
+        self._conn.commit()
+
+    def get(self, source, key):
+        """:return: the cached value (None for a negative entry), or MISS"""
+        with self._lock:
+            row = self._conn.execute("SELECT value, found, fetched FROM lookups WHERE source = ? AND key = ?", (source, key)).fetchone()
+            if row is not None:
+                value, found, fetched = row
+                ttl = self.ttls.get(source, 30 * DAY) if found else self.negative_ttl
+                if time.time() - fetched < ttl:
+                    self.stats[source + ".hit" if found else source + ".negative_hit"] += 1
+                    return pickle.loads(value) if found else None
+            self.stats[source + ".miss"] += 1
+        return MISS
+
+    def put(self, source, key, value):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO lookups VALUES (?, ?, ?, ?, ?)",
+                (source, key, pickle.dumps(value) if value is not None else None, value is not None, time.time()),
+            )
+            self._conn.commit()
+
+    def cached(self, source, key, fetch, *args, **kwargs):
+        value = self.get(source, key)
+        if value is MISS:
+            value = fetch(*args, **kwargs)
+            self.put(source, key, value)
+        return value
+
+    def snapshot(self):
+        """the lookups counted so far, safe to read while other threads look things up"""
+        with self._lock:
+            return dict(self.stats)
+
+    def new_stats(self):
+        """the lookups counted since the last call, for the report of one run"""
+        with self._lock:
+            stats = self.stats - self._reported
+            self._reported = Counter(self.stats)
+        return stats
+
+    def log_stats(self):
+        stats = self.snapshot()
+        for source in sorted({k.split(".")[0] for k in stats}):
+            hits, negative, miss = (stats.get(source + s, 0) for s in (".hit", ".negative_hit", ".miss"))
+            total = hits + negative + miss
+            logging.info(f"Lookup cache {source}: {hits} hits, {negative} negative hits, {miss} misses ({(hits + negative) / max(1, total):.0%} hit rate)")
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_cache():
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = LookupCache(os.environ.get("LOOKUP_CACHE", "LOOKUP_CACHE.sqlite"))
+        return _shared
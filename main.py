@@ -1,5 +1,4 @@
 
-from collections import OrderedDict
 import functools
 import logging
 import os
@@ -7,136 +6,81 @@ from pathlib import Path
 import re
 import sys
 import time
-from typing import Tuple, Union
 
 logging.basicConfig(level=logging.INFO, format=("\033[1m\033[94m%(levelname)s\033[0m | \033[92m%(filename)s:%(lineno)d - %(funcName)s\033[0m \033[90m(%(asctime)s)\033[0m\n" "%(message)s"))
 
 import pytz
-from pyzotero import zotero, zotero_errors
-import requests
 
-LOCAL_DB = dict()
-with open("LOCAL_DB", "r") as f:
-    for l in f.readlines():
-        name, key = l.strip().split("\t")
-        LOCAL_DB[name] = key
+from localdb import normalize_title, open_db
+from lookup_cache import shared_cache
+from metrics import METRICS, count, record, timed, timer
+
+# LOCAL_DB_BACKEND=tsv keeps the legacy append-only file, otherwise sqlite (WAL) migrated from it once
+if os.environ.get("LOCAL_DB_BACKEND", "sqlite") == "tsv":
+    LOCAL_DB = open_db(os.environ.get("LOCAL_DB_PATH", "LOCAL_DB"), backend="tsv")
+else:
+    LOCAL_DB = open_db(os.environ.get("LOCAL_DB_PATH", "LOCAL_DB.sqlite"), legacy_tsv="LOCAL_DB")
 
 def quick_add(title_key, id_key):
-    LOCAL_DB[title_key] = id_key
-    with open("LOCAL_DB", "a") as f:
-        # for title_key, id_key in LOCAL_DB.items():
-        f.write(f"{title_key}\t{id_key}\n")
-    logging.info(f"Add paper to LOCAL_DB, {title_key} : {LOCAL_DB[title_key]}")
+    # buffered, committed by LOCAL_DB.commit() at the end of each collection run
+    LOCAL_DB.add(title_key, id_key)
+    logging.info(f"Add paper to LOCAL_DB, {title_key} : {id_key}")
 
 
 # region localpdf
+from download import Downloader
+
+# pooled, rate-limited per host (arxiv.org asks for politeness), streaming to `<name>.part`
+DOWNLOADER = Downloader(
+    workers=int(os.environ.get("DOWNLOAD_WORKERS", 8)),
+    per_host_rate=float(os.environ.get("DOWNLOAD_RATE", 1.0)),
+)
+
 def download_pdf(pdf_url: str, p: Path):
     print(pdf_url, "save to", p)
-    headers = {
-    #"Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7",
-    #"Accept-Encoding": "gzip, deflate, br",
-    #"Accept-Language": "zh-CN,zh;q=0.9,en-US;q=0.8,en;q=0.7",
-    #"Cache-Control": "max-age=0",
-    ##"Cookie": "browser=202.120.38.125.1680155333113680; _ga=GA1.1.1866255749.1688641261; _ga_B1RR0QKWGQ=GS1.1.1699856236.4.1.1699856269.0.0.0; arxiv_bibex={%22active%22:true%2C%22ds_cs%22:%22S2%22%2C%22ds_eess%22:%22S2%22%2C%22ds_stat%22:%22S2%22%2C%22ds_cond-mat%22:%22S2%22%2C%22ds_q-bio%22:%22S2%22%2C%22ds_math%22:%22S2%22}; arxiv_labs={%22sameSite%22:%22strict%22%2C%22expires%22:365%2C%22bibex-toggle%22:%22enabled%22%2C%22litmaps-toggle%22:%22enabled%22%2C%22last_tab%22:%22tabone%22}",
-    #"Dnt": "1",
-    ##"If-Modified-Since": "Tue, 23 Jan 2024 03:01:48 GMT",
-    ##"If-None-Match": "\"16dde442-4a553-60f942ad02b85\"",
-    #"Sec-Ch-Ua": "\"Microsoft Edge\";v=\"119\", \"Chromium\";v=\"119\", \"Not?A_Brand\";v=\"24\"",
-    #"Sec-Ch-Ua-Mobile": "?0",
-    #"Sec-Ch-Ua-Platform": "\"macOS\"",
-    #"Sec-Fetch-Dest": "document",
-    #"Sec-Fetch-Mode": "navigate",
-    #"Sec-Fetch-Site": "none",
-    #"Sec-Fetch-User": "?1",
-    #"Upgrade-Insecure-Requests": "1",
-    "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/119.0.0.0 Safari/537.36 Edg/119.0.0.0"
-    }
-    response = requests.get(pdf_url, headers=headers)
-
-    # 确保请求是成功的
-    if response.status_code == 200:
-        with open(p, 'wb') as f:
-            f.write(response.content)
-        return p
-    else:
-        print("Error:", response.status_code)
-        return ""
+    return DOWNLOADER.fetch(pdf_url, p)
 # endregion
 
 # region parse-pdf
-def extract_metadata_from_pdf(pdf_path, article_dict: dict):
-    # article_dict = {}
-    article_dict["__error"] = True
-    if not pdf_path:
-        return article_dict
-    if type(pdf_path) != str:
-        try:
-            pdf_path = pdf_path.as_posix()
-            import PyPDF2
-            PyPDF2.PdfReader(pdf_path)
-        except Exception as e:
-            logging.warning("Error opening " + str(pdf_path) + ":" + str(e))
-            return article_dict
-    elif not pdf_path.endswith(".pdf"):
-        return article_dict
-    
+from grobid import GrobidPool
+from grobid_cache import ParseCache
+from library import arxiv_id
+from pdfcheck import shared_checker, shutdown_checker
+
+# shared by the arXiv path and create_db_from_public; reference PDF URLs are fetched by DOWNLOADER, per-host limited too
+GROBID = GrobidPool(
+    os.environ.get("GROBID_URLS", "").split(","),
+    health_ttl=float(os.environ.get("GROBID_HEALTH_TTL", 300)),
+    downloader=DOWNLOADER,
+)
+
+# set in __main__ unless --no-cache
+GROBID_CACHE = None
+GROBID_OPTIONS = dict(fulltext=True, return_coordinates=True)
+
+def parse_tei_scipdf(tei, name=""):
+    """GROBID TEI XML -> plain (json-able) dict, this is what GROBID_CACHE stores next to the TEI."""
     import scipdf  # pip install scipdf_parser
+    from bs4 import BeautifulSoup
+    article = BeautifulSoup(tei, "lxml")
 
-    # from .gpt_academic.crazy_functions.pdf_fns.parse_pdf import parse_pdf
-    # from .gpt_academic.crazy_functions.pdf_fns.report_gen_html import construct_html
-
-    for _grobid_url in os.environ["GROBID_URLS"].split(","):
-        if _grobid_url.endswith('/'): _grobid_url = _grobid_url.rstrip('/')
-        res = requests.get(_grobid_url+'/api/isalive')
-        if res.text != 'true':
-            continue
-    
-        # https://grobid.readthedocs.io/en/latest/training/header/
-        try:
-            article = scipdf.parse_pdf(pdf_path, grobid_url=_grobid_url, fulltext=True, soup=True, return_coordinates=True)
-            if "[GENERAL]" in article.text and "exception" in article.text:
-                logging.debug(article_dict["title"] + ":" + article.text)
-            else:
-                break
-        except Exception as e:
-            logging.debug(article_dict["title"] + ":" + str(e))
-    else:
-        logging.warning("GROBID服务不可用，请修改config中的GROBID_URL，可修改成本地GROBID服务。")
-        return article_dict
-
-    try:    
+    parsed = {}
+    try:
         title = article.find("title", attrs={"type": "main"})
-        title = title.text.strip() if title is not None else ""
-        if article_dict.get("title") and article_dict["title"].lower() != title.lower():
-            logging.debug("Title not match: %s vs %s", article_dict["title"], title)
-        else:
-            article_dict["title"] = title.title()
-
-        if article_dict.get("date") and article_dict["date"] != scipdf.parse_date(article):
-            logging.debug("Date not match: %s vs %s", article_dict["date"], scipdf.parse_date(article))
-        else:
-            article_dict["date"] = scipdf.parse_date(article)
-
-        if not article_dict.get("abstractNote"):
-            article_dict["abstractNote"] = scipdf.parse_abstract(article)
-
+        parsed["title"] = title.text.strip() if title is not None else ""
+        parsed["date"] = scipdf.parse_date(article)
+        parsed["abstract"] = scipdf.parse_abstract(article)
         doi = article.find("idno", attrs={"type": "DOI"})
-        doi = doi.text if doi is not None else ""
-        if article_dict.get("DOI") and article_dict["DOI"] != doi:
-            logging.debug("DOI not match: %s vs %s", article_dict["DOI"], doi)
-        else:
-            article_dict["DOI"] = doi
-
+        parsed["DOI"] = doi.text if doi is not None else ""
         try:
-            article_dict["tags"] = [{"tag": term_tag.text.lower()} for term_tag in article.find("keywords").find_all("term")]
+            parsed["keywords"] = [term_tag.text.lower() for term_tag in article.find("keywords").find_all("term")]
         except:
-            article_dict["tags"] = []
-        article_dict["tags"].append({"tag": "arXiv"})
+            parsed["keywords"] = []
     except Exception as e:
-        logging.warning(article_dict["title"] + ":" + str(e))
-    
+        logging.warning(name + ":" + str(e))
+
     # ignored by zotero upload
-    article_dict.update({
+    parsed.update({
         "__refs": [],
         "__authors": [],
         "__sections": [],
@@ -144,7 +88,14 @@ def extract_metadata_from_pdf(pdf_path, article_dict: dict):
         "__formulas": [],
     })
     try:
-        article_dict["__refs"] = scipdf.parse_references(article)
+        parsed["__refs"] = scipdf.parse_references(article)
+        # ids let the resolvers look references up in bulk instead of searching by title
+        references = article.find("text").find("div", attrs={"type": "references"})
+        for ref, bibl in zip(parsed["__refs"], references.find_all("biblstruct") if references is not None else []):
+            doi = bibl.find("idno", attrs={"type": "DOI"})
+            arxiv = bibl.find("idno", attrs={"type": "arXiv"})
+            ref["doi"] = doi.text.strip() if doi is not None else ""
+            ref["arxiv"] = arxiv_id(arxiv.text) if arxiv is not None else ""
     
         authors = []
         # Find all author tags with an affiliation child
@@ -165,14 +116,96 @@ def extract_metadata_from_pdf(pdf_path, article_dict: dict):
                 authors.append((forename + ' ' + surname, affiliations_list))
             except:
                 continue
-        article_dict["__authors"] = authors
+        parsed["__authors"] = authors
 
-        article_dict["__sections"] = scipdf.parse_sections(article, as_list=False)
-        article_dict["__figures"] = scipdf.parse_figure_caption(article)
-        article_dict["__formulas"] = scipdf.parse_formulas(article)
+        parsed["__sections"] = scipdf.parse_sections(article, as_list=False)
+        parsed["__figures"] = scipdf.parse_figure_caption(article)
+        parsed["__formulas"] = scipdf.parse_formulas(article)
         # scipdf.parse_figures('example_data', output_folder='figures') # folder should contain only PDF files
     except Exception as e:
-        logging.warning(article_dict["title"] + ":" + str(e))
+        logging.warning(name + ":" + str(e))
+    return parsed
+
+from tei import parse as parse_tei_lxml
+# TEI_PARSER=scipdf falls back to the BeautifulSoup / scipdf walk, the lxml one returns the same dict
+parse_tei = parse_tei_scipdf if os.environ.get("TEI_PARSER") == "scipdf" else parse_tei_lxml
+# what GROBID_CACHE entries are derived with; bump the version when the dict parse_tei returns changes
+PARSE_SCHEMA = ("scipdf" if parse_tei is parse_tei_scipdf else "lxml") + ":2"
+
+def degraded_metadata(article_dict, header):
+    """fills what GROBID would have from the first page read by pdfcheck, the item is still created without a note"""
+    if not header or not header["ok"]:
+        return article_dict
+    count("pdf.degraded")
+    for field, value in (("title", header["title"]), ("abstractNote", header["abstract"]), ("DOI", header["doi"])):
+        if value and not article_dict.get(field):
+            article_dict[field] = value
+    return article_dict
+
+def extract_metadata_from_pdf(pdf_path, article_dict: dict, header=None):
+    """
+    :param header: `pdfcheck.check` of a local `pdf_path`, checked here if not given; its first-page title /
+        abstract / DOI fill in for GROBID when no GROBID endpoint answers
+    """
+    # article_dict = {}
+    article_dict["__error"] = True
+    if not pdf_path:
+        return article_dict
+    if type(pdf_path) != str:
+        pdf_path = pdf_path.as_posix()
+        if header is None:
+            header = shared_checker().check(pdf_path)
+        if not header["ok"]:
+            logging.warning("Error opening " + str(pdf_path) + ":" + header["error"])
+            return article_dict
+    elif not pdf_path.endswith(".pdf"):
+        return article_dict
+
+    # from .gpt_academic.crazy_functions.pdf_fns.parse_pdf import parse_pdf
+    # from .gpt_academic.crazy_functions.pdf_fns.report_gen_html import construct_html
+
+    pdf = GROBID.load(pdf_path)
+    if pdf is None:
+        return article_dict
+    cache_key = ParseCache.key(pdf, **GROBID_OPTIONS)
+    parsed = GROBID_CACHE.get(cache_key) if GROBID_CACHE is not None else None
+    if parsed is not None:
+        logging.debug("GROBID cache hit: " + str(pdf_path))
+    else:
+        # an entry of an older parser is parsed again from its TEI, without asking GROBID
+        tei = GROBID_CACHE.get_tei(cache_key) if GROBID_CACHE is not None else None
+        if tei is None:
+            tei = GROBID.process(pdf, **GROBID_OPTIONS)
+        if tei is None:
+            logging.warning("GROBID服务不可用，请修改config中的GROBID_URL，可修改成本地GROBID服务。")
+            return degraded_metadata(article_dict, header)
+        with timed("tei.parse"):
+            parsed = parse_tei(tei, article_dict.get("title", ""))
+        if GROBID_CACHE is not None:
+            GROBID_CACHE.put(cache_key, tei, parsed)
+
+    if "title" in parsed:
+        title = parsed["title"]
+        if article_dict.get("title") and article_dict["title"].lower() != title.lower():
+            logging.debug("Title not match: %s vs %s", article_dict["title"], title)
+        else:
+            article_dict["title"] = title.title()
+    if "date" in parsed:
+        if article_dict.get("date") and article_dict["date"] != parsed["date"]:
+            logging.debug("Date not match: %s vs %s", article_dict["date"], parsed["date"])
+        else:
+            article_dict["date"] = parsed["date"]
+    if not article_dict.get("abstractNote") and "abstract" in parsed:
+        article_dict["abstractNote"] = parsed["abstract"]
+    if "DOI" in parsed:
+        if article_dict.get("DOI") and article_dict["DOI"] != parsed["DOI"]:
+            logging.debug("DOI not match: %s vs %s", article_dict["DOI"], parsed["DOI"])
+        else:
+            article_dict["DOI"] = parsed["DOI"]
+    article_dict["tags"] = [{"tag": kw} for kw in parsed.get("keywords", [])]
+    article_dict["tags"].append({"tag": "arXiv"})
+
+    article_dict.update({k: v for k, v in parsed.items() if k.startswith("__")})
     del article_dict["__error"]
     return article_dict
 
@@ -220,6 +253,14 @@ def generate_html(title, url, authors, keywords, abstract, subsections):
 
 
 # region zotero
+from concurrent.futures import Future
+
+from executor import rate_limit, shared_executor, shutdown_shared
+from journal import reached
+from pipeline import Once, Pipeline, Stage
+from titleindex import TitleIndex
+from zotero_batch import client, close_writers, get_writer, item_uri, new_key, rate_service
+
 def fetch_items_from_collection(zot, collection_key):
     all_items = []
     
@@ -234,37 +275,202 @@ def fetch_items_from_collection(zot, collection_key):
     
     return all_items
 
-def query_title(title, zot):
-    items = zot.items(q=title.lower())
+ARXIV_PDF_URL = os.environ.get("ARXIV_PDF_URL", "https://arxiv.org/pdf/")
+
+# set in __main__, per-paper progress so an interrupted run resumes each paper where it stopped
+JOURNAL = None
+
+# set in __main__, citing paper -> reference edges of everything ingested, see citegraph.py
+CITEGRAPH = None
+
+# set in __main__, answers existence checks from a local copy of the library instead of `q=` searches
+LIBRARY = None
+
+@timer("zotero.query_title")
+def query_title(title, zot, doi="", arxiv=""):
+    if LIBRARY is not None:
+        return LIBRARY.query_title(title, doi, arxiv)
+    rate_limit(rate_service(zot))
+    items = client(zot).items(q=title.lower())
     titles = {item["data"]["title"].lower():item for item in items if "title" in item["data"]}
     return titles
 
-def update_by_arxiv(results, save_root, collection, zot, update_db_callback=None, _predef_tags = []):
-    save_root.mkdir(exist_ok=True, parents=True)
+# threads per stage of update_by_arxiv, e.g. PIPELINE_WORKERS="download=8,check=4,parse=4,resolve=2,write=2,link=2"
+STAGE_WORKERS = {"download": 8, "check": 4, "parse": 4, "resolve": 2, "write": 2, "link": 2}
+STAGE_WORKERS.update({k: int(v) for k, v in (kv.split("=") for kv in os.environ.get("PIPELINE_WORKERS", "").split(",") if kv)})
+# title_key -> first paper that created it, shared by all workers and all SEARCH_QUERYS
+CREATED = Once()
+# reference key -> created zotero item
+REF_CREATED = Once()
+# references in flight; the same reference cited with a slightly different title, or with the same DOI / arXiv id, gets the same key
+REF_KEYS = TitleIndex()
+
+def ref_key(art):
+    return REF_KEYS.setdefault(normalize_title(art["title"]), art["title"], art.get("doi"), art.get("arxiv"))
+# reference resolution for every paper shares one bounded pool, see executor.py
+IO = shared_executor()
+# set in __main__ to the resolver's bulk lookup (e.g. sscholar.prefetch), called with the references not in the library
+RESOLVER_PREFETCH = None
+
+def _done_future(result):
+    future = Future()
+    future.set_result(result)
+    return future
+
+def _written(paper, zot, name, key):
+    """The item / note (`name`) an earlier, interrupted run already wrote under its pre-assigned `key`, else None."""
+    if paper["entry"].get(name):
+        return paper["entry"][name]
+    if not paper["resumed"]:
+        return None
+    from pyzotero import zotero_errors
+    rate_limit(rate_service(zot))
+    try:
+        return client(zot).item(key)
+    except zotero_errors.ResourceNotFound:
+        return None
 
-    metadatas = []
-    for result in results:
-        title_key = result.title.lower()
-        if title_key in LOCAL_DB:
-            logging.debug("Title: " + result.title + " exists.")
-            continue
-        titles = query_title(title_key, zot)
-        if title_key in titles:
-            logging.info(f"{result.title} exists but not in LOCAL_DB.")
-            quick_add(title_key, titles[title_key]["key"])
-            continue
-
-        result.entry_id = result.entry_id.split("/")[-1]
-        result.pdf_url = "https://arxiv.org/pdf/" + result.entry_id + ".pdf"
-        save_name = \
-            result.updated.astimezone(pytz.timezone("Asia/Shanghai")).strftime("%Y%m%d") + \
-            "-20" + result.entry_id + \
-            "_" + re.sub("[^A-Za-z0-9 -]+", "", title_key).replace(" ", "-") + \
-            ".pdf"
-        pdf_path = download_pdf(result.pdf_url, (save_root / save_name))
+def create_arxiv_item(paper, zot):
+    metadata = paper["metadata"]
+    template = {k:v for k,v in metadata.items() if not k.startswith("__")}
+    template["tags"] = template["tags"] + [{"tag": t } for t in paper["tags"]]
+    template["tags"] = list(i for i in template["tags"] if type(i["tag"]) == str and i["tag"] != "" and len(i["tag"]) < 40)
+    # written in 50-object batches together with other papers' items, notes and references
+    writer = get_writer(zot)
+    written = _written(paper, zot, "item", template["key"])
+    paper["item"] = _done_future(written) if written is not None else writer.add(template)
+    if LIBRARY is not None:
+        paper["item"].add_done_callback(lambda f: f.exception() is None and LIBRARY.add(f.result()))
+
+    # add attachment
+    # attachment = zot.item_template("attachment", linkmode="imported_url") # need upload
+    # attachment = zot.item_template("attachment", linkmode="linked_url")
+    # attachment["title"] = result.entry_id + ".pdf"        
+
+    # add note
+    if "__error" in metadata:
+        return paper
+    
+    written = _written(paper, zot, "note", metadata["__note_key"])
+    if written is not None:
+        paper["note"] = _done_future(written)
+        return paper
+    note = client(zot).item_template("note")
+    note["key"] = metadata["__note_key"]
+    note["parentItem"] = template["key"]
+    note["note"] = generate_html(
+        metadata["title"],
+        metadata["url"],
+        metadata["__authors"],
+        [tag["tag"] for tag in template["tags"]],
+        metadata["abstractNote"],
+        [i["heading"] for i in metadata["__sections"]],
+    )
+    paper["note"] = writer.add(note, after=paper["item"])
+    return paper
+
+def update_by_arxiv(results, save_root, collection, zot, update_db_callback=None, _predef_tags = [], workers=None, assignments=None):
+    """
+    :param assignments: from `harvest.plan`, arXiv id -> {"names", "collections", "tags"} of every query that matched
+        the paper; it is saved under `save_root / names[0]` and written once with all collections and tags.
+        Results without an entry use `save_root`, `collection` and `_predef_tags`.
+    With JOURNAL set, every completed step of a paper is recorded, and a paper an earlier run left unfinished
+    continues after its last completed step.
+    """
+    workers = {**STAGE_WORKERS, **(workers or {})}
+    assignments = assignments or {}
+
+    def advance(paper, state, **data):
+        paper["entry"].update(data, state=state)
+        if JOURNAL is not None:
+            JOURNAL.advance(paper["aid"], state, **data)
+
+    def plan(results):
+        for result in results:
+            title_key = result.title.lower()
+            aid = re.sub(r"v\d+$", "", result.get_short_id())
+            entry = JOURNAL.get(aid) if JOURNAL is not None else None
+            if entry is not None:
+                due, attempts = JOURNAL.attempt(aid)
+                if due == "wait":
+                    logging.debug(f"{result.title} backs off after {entry['state']} (attempt {attempts})")
+                    count("papers.backoff")
+                    continue
+                if due == "abandon":
+                    logging.warning(f"Give up {result.title} for {JOURNAL.abandon_ttl / 3600:.0f}h: still after {entry['state']} when {attempts} runs ended")
+                    count("papers.abandoned")
+                    record("papers.abandoned", aid)
+                    continue
+                # the item may exist already, but without note / relations yet
+                logging.info(f"Resume {result.title} after {entry['state']} (attempt {attempts})")
+            elif title_key in LOCAL_DB:
+                logging.debug("Title: " + result.title + " exists.")
+                continue
+            elif LIBRARY is not None and LIBRARY.find_arxiv(result.entry_id):
+                logging.info(f"{result.title} exists (arXiv id) but not in LOCAL_DB.")
+                quick_add(title_key, LIBRARY.find_arxiv(result.entry_id)["key"])
+                continue
+            else:
+                titles = query_title(title_key, zot)
+                if title_key in titles:
+                    logging.info(f"{result.title} exists but not in LOCAL_DB.")
+                    quick_add(title_key, titles[title_key]["key"])
+                    continue
 
+            result.entry_id = result.entry_id.split("/")[-1]
+            result.pdf_url = ARXIV_PDF_URL + result.entry_id + ".pdf"
+            save_name = \
+                result.updated.astimezone(pytz.timezone("Asia/Shanghai")).strftime("%Y%m%d") + \
+                "-20" + result.entry_id + \
+                "_" + re.sub("[^A-Za-z0-9 -]+", "", title_key).replace(" ", "-") + \
+                ".pdf"
+            assignment = assignments.get(re.sub(r"v\d+$", "", result.entry_id))
+            if assignment is not None:
+                paper_root = save_root / assignment["names"][0]
+                collections, tags = assignment["collections"], assignment["tags"]
+            else:
+                paper_root, collections, tags = save_root, [collection], _predef_tags
+            paper_root.mkdir(exist_ok=True, parents=True)
+            paper = {"result": result, "aid": aid, "title_key": title_key, "resumed": entry is not None, "entry": entry or {}}
+            if entry is None:
+                count("papers.new")
+                advance(paper, "planned", pdf_path=str(paper_root / save_name), collections=collections, tags=tags)
+            else:
+                count("papers.resumed")
+            paper.update(pdf_path=Path(paper["entry"]["pdf_path"]), collections=paper["entry"]["collections"], tags=paper["entry"]["tags"])
+            yield paper
+
+    def download(paper):
+        if reached(paper["entry"], "downloaded") and paper["pdf_path"].exists():
+            return paper
+        paper["pdf_path"] = download_pdf(paper["result"].pdf_url, paper["pdf_path"])
+        if paper["pdf_path"]:
+            advance(paper, "downloaded")
+        return paper
+
+    def check(paper):
+        # PDFs are validated in worker processes, a broken download is fetched again before it gets to GROBID
+        if reached(paper["entry"], "parsed") or not paper["pdf_path"]:
+            return paper
+        header = shared_checker().check(paper["pdf_path"])
+        aid = header["arxiv"]
+        if header["ok"] and aid and aid != paper["aid"]:
+            header.update(ok=False, error=f"first page is arXiv:{aid}")
+        if not header["ok"]:
+            logging.warning(f"{paper['pdf_path']}: {header['error']}, downloading it again")
+            DOWNLOADER.discard(paper["pdf_path"])
+            paper["pdf_path"] = download_pdf(paper["result"].pdf_url, paper["pdf_path"])
+            header = shared_checker().check(paper["pdf_path"]) if paper["pdf_path"] else None
+        paper["header"] = header
+        return paper
+
+    def parse(paper):
+        if reached(paper["entry"], "parsed"):
+            paper["metadata"] = paper["entry"]["metadata"]
+            return paper
+        result = paper["result"]
         # 根据元数据创建一个 Zotero item
-        template = zot.item_template('Preprint')
+        template = client(zot).item_template('Preprint')
         template['title'] = result.title.title()
         template['abstractNote'] = result.summary
         template['url'] = result.pdf_url
@@ -280,88 +486,132 @@ def update_by_arxiv(results, save_root, collection, zot, update_db_callback=None
         template['archiveLocation'] = result.entry_id
         template['extra'] = result.entry_id
         # zot.addto_collection(collection, template)
-        template["collections"] = [collection]
+        template["collections"] = paper["collections"]
         # shortTitle
 
-        metadata = extract_metadata_from_pdf(pdf_path, template)
-        template = {k:v for k,v in metadata.items() if not k.startswith("__")}
-        template["tags"].extend([{"tag": t } for t in _predef_tags])
-        template["tags"] = list(i for i in template["tags"] if type(i) == str and i != "" and len(i) < 40)
-        response0 = zot.create_items([template])
-        logging.info(str(response0))
-        assert len(response0["successful"]) == 1, response0
-        key = response0["successful"]["0"]["key"]
-
-        # add attachment
-        # attachment = zot.item_template("attachment", linkmode="imported_url") # need upload
-        # attachment = zot.item_template("attachment", linkmode="linked_url")
-        # attachment["title"] = result.entry_id + ".pdf"        
-
-        # add note
-        metadatas.append(metadata)
+        # keys are assigned before the first write, so a resumed run can tell whether the item / note already exist
+        template["key"] = new_key()
+        template["__note_key"] = new_key()
+        paper["metadata"] = extract_metadata_from_pdf(paper["pdf_path"], template, paper.get("header"))
+        advance(paper, "parsed", metadata=paper["metadata"])
+        return paper
+
+    def resolve(paper):
+        # references are found / created before the parent, so its relations go out with the item itself
+        metadata = paper["metadata"]
+        if reached(paper["entry"], "resolved"):
+            paper["refs"] = paper["entry"]["refs"]
+            return paper
+        paper["refs"] = []
         if "__error" in metadata:
-            continue
-        
-        note = zot.item_template("note")
-        note["parentItem"] = key
-        note["note"] = generate_html(
-            metadata["title"],
-            metadata["url"],
-            metadata["__authors"],
-            [tag["tag"] for tag in metadata["tags"]],
-            metadata["abstractNote"],
-            [i["heading"] for i in metadata["__sections"]],
-        )
-        response1 = zot.create_items([note])
-        logging.info(str(response1))
-        assert len(response1["successful"]) == 1
-        quick_add(title_key, response1["successful"]["0"]["key"])
+            return paper
 
         # add subitems
         from tqdm import tqdm
         pbar = tqdm(total=len(metadata["__refs"]))
         update = lambda *args: pbar.update()
-        import multiprocessing as MP
-        pool = MP.Pool(64)
         refs = []
+        found = {art["title"].lower(): query_title(art["title"].lower(), zot, art.get("doi"), art.get("arxiv")) for art in metadata["__refs"] if art.get("title")}
+        missing = [art for art in metadata["__refs"] if art.get("title") and art["title"].lower() not in found[art["title"].lower()]]
+        count("refs.in_library", len(found) - len({art["title"].lower() for art in missing}))
+        count("refs.missing", len(missing))
+        if missing and RESOLVER_PREFETCH is not None:
+            RESOLVER_PREFETCH(missing)
+        # the same reference cited by several papers in flight is only created once,
+        # and the references most of our papers cite are queued first
+        if CITEGRAPH is not None:
+            cited = CITEGRAPH.times_cited_many([art["title"] for art in missing])
+            missing = [art for _, art in sorted(zip(cited, missing), key=lambda pair: -pair[0])]
+        # one key per reference: REF_KEYS is shared with the other resolve workers, asking it again could match differently
+        keys = {id(art): ref_key(art) for art in missing}
+        created = {}
+        for art in missing:
+            key = keys[id(art)]
+            if key not in created:
+                created[key] = IO.submit(REF_CREATED, key, update_db_callback, art)
         for art in metadata["__refs"]:
             if not art.get("title"):
                 update()
                 continue
-            titles = query_title(art["title"].lower(), zot)
+            titles = found[art["title"].lower()]
             if art["title"].lower() not in titles:
-                refs.append(pool.apply_async(update_db_callback, (art,), callback=update))
+                future = created[keys[id(art)]]
+                future.add_done_callback(update)
+                refs.append(future)
             else:
                 update()
                 refs.append(titles[art["title"].lower()])
 
         for idx in range(len(refs)):
             item = refs[idx]
-            if type(item) == MP.pool.AsyncResult:
+            if isinstance(item, Future):
                 try:
-                    item = item.get()
+                    item = item.result()
                 except Exception as e:
                     logging.warning("Subdata get: " + str(e))
-                    refs[idx] = None
                     continue
 
             if item["data"]["title"].lower() not in LOCAL_DB:
                 quick_add(item["data"]["title"].lower(), item["data"]["key"])
-            url = "http://zotero.org/groups/{}/items/{}".format(item["library"]["id"], item["data"]["key"])
-            logging.debug("Link: " + metadata["title"] + " to " + art["title"])
-            refs[idx] = url
-        response0["successful"]["0"]["data"]["relations"] = {'dc:relation': [r for r in refs if r is not None]}
-        try:
-            response2 = zot.update_item(response0["successful"]["0"])
-            assert response2
-        except zotero_errors.PreConditionFailed as e:
-            # Response: Item has been modified since specified version (expected 6719, found 6721)
-            logging.warning(f"{e}")
-            response00 = zot.items(q=response0["successful"]["0"]["data"]["title"])[0]
-            response00["data"]["relations"] = {'dc:relation': [r for r in refs if r is not None]}
-            response2 = zot.update_item(response00)
-            assert response2
-    return metadatas
+            logging.debug("Link: " + metadata["title"] + " to " + item["data"]["title"])
+            if all(r["key"] != item["key"] for r in paper["refs"]):
+                paper["refs"].append(item)
+        pbar.close()
+        metadata["relations"] = {"dc:relation": [item_uri(item) for item in paper["refs"]]}
+        advance(paper, "resolved", metadata=metadata, refs=paper["refs"])
+        return paper
+
+    def write(paper):
+        if CREATED(paper["title_key"], create_arxiv_item, paper, zot) is not paper:
+            logging.info(f"{paper['result'].title} is created by another worker.")
+            # the other paper's item stands for this one too, nothing left to resume
+            if JOURNAL is not None:
+                JOURNAL.done(paper["aid"])
+            return None
+        return paper
+
+    def link(paper):
+        item = paper["item"].result()
+        if not reached(paper["entry"], "item_created"):
+            advance(paper, "item_created", item=item)
+        if "__error" in paper["metadata"]:
+            if JOURNAL is not None:
+                JOURNAL.done(paper["aid"])
+            return paper
+        note = paper["note"].result()
+        if not reached(paper["entry"], "note_created"):
+            advance(paper, "note_created", note=note)
+        quick_add(paper["title_key"], note["key"])
+
+        # reverse links, referenced item -> this paper, batched with the other papers' backlinks and items
+        uri = item_uri(item)
+        writer = get_writer(zot)
+        for future in [writer.add_relations(ref, [uri]) for ref in paper["refs"]]:
+            try:
+                ref = future.result()
+            except Exception as e:
+                logging.warning("Relation update: " + str(e))
+                continue
+            if LIBRARY is not None:
+                LIBRARY.add(ref)
+        if CITEGRAPH is not None:
+            # references that could not be found / created stay in the graph as missing from the library
+            linked = {normalize_title(ref["data"]["title"]) for ref in paper["refs"]}
+            unresolved = [art for art in paper["metadata"]["__refs"] if art.get("title") and normalize_title(art["title"]) not in linked]
+            CITEGRAPH.add_paper(item, paper["refs"] + unresolved)
+        if JOURNAL is not None:
+            JOURNAL.done(paper["aid"])
+        return paper
+
+    pipeline = Pipeline([
+        Stage("download", download, workers["download"]),
+        Stage("check", check, workers["check"]),
+        Stage("parse", parse, workers["parse"]),
+        Stage("resolve", resolve, workers["resolve"]),
+        Stage("write", write, workers["write"]),
+        Stage("link", link, workers["link"]),
+    ])
+    return [paper["metadata"] for paper in pipeline.run(plan(results))]
 
 # endregion
 
@@ -369,8 +619,19 @@ def create_db_from_public(article, retrieve_info_func, save_root, collection, zo
     # COLLECTION = "MKR87F5B"
     save_root.mkdir(exist_ok=True, parents=True)
 
-    template = retrieve_info_func(article, zot)
+    if LIBRARY is not None:
+        # e.g. created since the reference was resolved, no need to ask the resolver
+        existing = LIBRARY.find(article.get("title", ""), article.get("doi"), article.get("arxiv"))
+        if existing is not None:
+            logging.debug("Reference exists: " + article["title"])
+            return existing
+    template = retrieve_info_func(article, client(zot))
     template["collections"] = [collection]
+    if LIBRARY is not None:
+        existing = LIBRARY.find(template["title"], template.get("DOI"), template.get("archive"))
+        if existing is not None:
+            logging.debug("Reference exists: " + template["title"])
+            return existing
 
     metadata = extract_metadata_from_pdf(template["url"], template)
 
@@ -380,41 +641,157 @@ def create_db_from_public(article, retrieve_info_func, save_root, collection, zo
             metadata['creators'].append({'creatorType': 'author', 'firstName': author.split(" ")[0] , 'lastName': author.split(" ")[1]})
 
     template = {k:v for k,v in metadata.items() if not k.startswith("__")}
-    response = zot.create_items([template])
-    logging.info(str(response))
-    assert len(response["successful"]) == 1
-    return response["successful"]["0"]
+    item = get_writer(zot).add(template).result()
+    if LIBRARY is not None:
+        LIBRARY.add(item)
+    return item
+
+# region libraries
+def use_library(lib):
+    """Points the module state update_by_arxiv works with (LOCAL_DB, LIBRARY, JOURNAL, CITEGRAPH, dedup) at `lib`."""
+    global LOCAL_DB, LIBRARY, JOURNAL, CITEGRAPH, CREATED, REF_CREATED, REF_KEYS
+    LOCAL_DB, LIBRARY, JOURNAL, CITEGRAPH = lib.local_db, lib.mirror, lib.journal, lib.citegraph
+    CREATED, REF_CREATED, REF_KEYS = Once(), Once(), TitleIndex()
+
+def sync_library(lib, fetched, client, save_root, retrieve_info):
+    """
+    Ingests into `lib` the results of the sources it subscribes to. Papers another library already ingested
+    in this run are not downloaded or parsed again: the PDF is on disk and the parse in GROBID_CACHE.
+    :param fetched: [(source, results)] in source declaration order
+    """
+    import arxiv
+    from harvest import plan
+
+    logging.info(f"Sync {lib}")
+    use_library(lib)
+    lib.mirror.sync()
+    results, assignments = plan([(source.name, *lib.assignment(source), results) for source, results in fetched if lib.subscribes(source)])
+    # papers an interrupted run left half-done, even if no query lists them any more
+    pending = [aid for aid in lib.journal.pending() if aid not in assignments]
+    if pending:
+        logging.info(f"Resume {len(pending)} unfinished papers from the journal")
+        results += list(client.results(arxiv.Search(id_list=pending, max_results=len(pending))))
+    update_db = functools.partial(create_db_from_public, retrieve_info_func=retrieve_info, save_root=save_root / "DATABASE", collection=lib.ref_collection, zot=lib.zot)
+    try:
+        if results:
+            update_by_arxiv(results=results, save_root=save_root, collection=None, zot=lib.zot, update_db_callback=update_db, assignments=assignments)
+    finally:
+        lib.save()
+# endregion
 
-if __name__ == '__main__':
+# region run
+def start(no_cache=False, refresh=False):
+    """
+    Process-wide setup shared by a one-shot run and daemon.py: GROBID parse cache, PDF checker, GROBID health,
+    the libraries to sync (LIBRARIES=libraries.json, else the one of the environment, see libraries.py),
+    the arXiv client and the harvest state.
+    :return: {"save_root", "libraries", "client", "harvest", "retrieve_info", "import_db"}
+    """
+    global GROBID_CACHE, RESOLVER_PREFETCH
     save_root = Path(os.environ["SAVE_ROOT"])
+    if not no_cache:
+        GROBID_CACHE = ParseCache(
+            os.environ.get("GROBID_CACHE", save_root / ".grobid_cache"),
+            max_bytes=int(os.environ.get("GROBID_CACHE_MB", 2048)) << 20,
+            refresh=refresh,
+            schema=PARSE_SCHEMA,
+        )
 
-    for _grobid_url in os.environ["GROBID_URLS"].split(","):
-        if _grobid_url.endswith('/'): _grobid_url = _grobid_url.rstrip('/')
-        res = requests.get(_grobid_url+'/api/isalive')
-        if res.text != 'true':
-            logging.warning("Error:" + _grobid_url + "----" + res.text)
+    # forks its workers now, before any other thread runs
+    shared_checker()
+    GROBID.check_all()
 
-    key = os.environ["ZOTERO_KEY"]
-    if os.environ["USER_ID"]:
-        zot = zotero.Zotero(os.environ["USER_ID"], "user", key)
+    from libraries import Library, load_libraries
+    if os.environ.get("LIBRARIES"):
+        libraries = load_libraries(os.environ["LIBRARIES"])
     else:
-        zot = zotero.Zotero(os.environ["GROUP_ID"], "group", key)
+        libraries = [Library.from_env(LOCAL_DB)]
+    for lib in libraries:
+        lib.open()
+
+    from harvest import HarvestState
+    from sources import ArxivClient, FeedCache, RssFeed
+    RssFeed.feed_cache = FeedCache(os.environ.get("FEED_CACHE", "FEED_CACHE.json"))
+
+    # from dblp import retrieve_info
+    # from gscholar import retrieve_info
+    from sscholar import prefetch, retrieve_info
+    RESOLVER_PREFETCH = prefetch
+    return {
+        "save_root": save_root,
+        "libraries": libraries,
+        "client": ArxivClient(),
+        "harvest": HarvestState(os.environ.get("HARVEST_STATE", "HARVEST_STATE.json")),
+        "retrieve_info": retrieve_info,
+        "import_db": LOCAL_DB,  # opened at import, the LOCAL_DB of a one-library run
+    }
 
-    import arxiv
-    from search import SEARCH_QUERYS
-    client = arxiv.Client()
-    for name, collection, search_query, max_res, tags in SEARCH_QUERYS:
-        results = client.results(arxiv.Search(
-            max_results=max_res,
-            sort_by=arxiv.SortCriterion.SubmittedDate,
-            sort_order=arxiv.SortOrder.Descending,
-            **search_query
-        ))
-        # https://export.arxiv.org/api/query?search_query=(cat:eess.SP+OR+cat:cs.SD+OR+cat:eess.AS+OR+cat:cs.AI)+AND+(ASR+OR+speech+recognition)&sortBy=submittedDate&sortOrder=descending&start=0&max_results=1000
-
-        # from dblp import retrieve_info
-        # from gscholar import retrieve_info
-        from sscholar import retrieve_info
-        update_db = functools.partial(create_db_from_public, retrieve_info_func=retrieve_info, save_root=save_root / "DATABASE", collection="MKR87F5B", zot=zot)
-    
-        metadatas = update_by_arxiv(results = results, save_root = save_root / name, collection = collection, zot = zot, update_db_callback=update_db, _predef_tags=tags)
+def ingest(run, sources, backfill=False, mark=True):
+    """
+    Fetches every source any library wants once, concurrently, then syncs the libraries one after the other;
+    each library processes each unique paper once.
+    :param mark: record the results in the harvest state, off for one-off id lists
+    :return: the libraries that failed
+    """
+    from sources import RssFeed, fetch_all
+    libraries, harvest = run["libraries"], run["harvest"]
+    sources = [source for source in sources if any(lib.subscribes(source) for lib in libraries)]
+    fetched = list(fetch_all(sources, run["client"], harvest, backfill=backfill))
+    # https://export.arxiv.org/api/query?search_query=(cat:eess.SP+OR+cat:cs.SD+OR+cat:eess.AS+OR+cat:cs.AI)+AND+(ASR+OR+speech+recognition)&sortBy=submittedDate&sortOrder=descending&start=0&max_results=1000
+    # keep the declaration order, so a paper is saved under the first query that lists it
+    fetched.sort(key=lambda f: sources.index(f[0]))
+
+    failed = []
+    try:
+        for lib in libraries:
+            try:
+                sync_library(lib, fetched, run["client"], run["save_root"], run["retrieve_info"])
+            except Exception as e:
+                logging.exception(f"Sync {lib} failed: {e}")
+                failed.append(lib)
+            close_writers()
+        # a library that failed gets the same results again next run, the others skip them as existing
+        if mark and not failed:
+            for source, query_results in fetched:
+                harvest.mark(source.key, query_results, backfill=backfill, listed=source.listing)
+    finally:
+        harvest.save()
+        RssFeed.feed_cache.save()
+    return failed
+
+def report():
+    """writes the metrics of the run that just ended, with the lookup cache hits / misses of that run"""
+    METRICS.merge("lookup", shared_cache().new_stats())
+    METRICS.log_summary()
+    METRICS.write_json(os.environ.get("RUN_REPORT", "RUN_REPORT.json"))
+    if os.environ.get("METRICS_TEXTFILE"):
+        METRICS.write_prometheus(os.environ["METRICS_TEXTFILE"])
+
+def stop(run):
+    close_writers()
+    shared_cache().log_stats()
+    report()
+    for lib in run["libraries"]:
+        lib.close()
+    run["import_db"].close()
+    DOWNLOADER.shutdown()
+    shutdown_shared()
+    shutdown_checker()
+# endregion
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--no-cache", action="store_true", help="do not use the GROBID parse cache (libraries then parse shared papers each)")
+    parser.add_argument("--refresh", action="store_true", help="re-parse every PDF and overwrite the GROBID parse cache")
+    parser.add_argument("--backfill", action="store_true", help="walk the next max_results older results of each query instead of the new ones")
+    args = parser.parse_args()
+
+    run = start(no_cache=args.no_cache, refresh=args.refresh)
+    from search import SOURCES
+    try:
+        failed = ingest(run, SOURCES, backfill=args.backfill)
+    finally:
+        stop(run)
+    if failed:
+        sys.exit(f"Sync failed for {', '.join(lib.name for lib in failed)}")
@@ -0,0 +1,171 @@
+from collections import Counter
+import bisect
+import contextlib
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+# latency histogram bounds in seconds, wide enough for a zotero lookup (ms) and a GROBID parse (minutes)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-quantile (the max for the +Inf bucket)."""
+        if not self.count:
+            return 0.0
+        rank, seen = q * self.count, 0
+        for bound, n in zip(self.buckets + (self.max,), self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self):
+        return {
+            "count": self.count, "sum": round(self.sum, 3), "mean": round(self.sum / max(1, self.count), 4), "max": round(self.max, 4),
+            "p50": round(self.quantile(0.5), 4), "p90": round(self.quantile(0.9), 4), "p99": round(self.quantile(0.99), 4),
+        }
+
+
+class Metrics:
+    """
+    Thread-safe run metrics: latency histograms per operation (`timed`, `observe`) and plain counters
+    (`count`: bytes, retries, errors, cache hits ...). Counters named `<x>.hit` / `<x>.miss` are reported
+    as a hit rate of `<x>`. `record` keeps a list of values under a name (e.g. the ids a run gave up on).
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.timings = {}
+        self.counters = Counter()
+        self.records = {}
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Starts a new run, dropping what was recorded so far (a long-running process reports per run)."""
+        with self._lock:
+            self.started = time.time()
+            self.timings = {}
+            self.counters = Counter()
+            self.records = {}
+
+    def observe(self, name, seconds):
+        with self._lock:
+            if name not in self.timings:
+                self.timings[name] = Histogram()
+            self.timings[name].observe(seconds)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] += n
+
+    def record(self, name, value):
+        with self._lock:
+            self.records.setdefault(name, []).append(value)
+
+    def merge(self, prefix, counter):
+        """Adds counters kept elsewhere (e.g. `LookupCache.stats`) under `prefix.`"""
+        with self._lock:
+            for name, n in counter.items():
+                self.counters[f"{prefix}.{name}"] += n
+
+    @contextlib.contextmanager
+    def timed(self, name):
+        """Times the block as `name`; an exception also counts `name.errors`."""
+        start = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            self.count(name + ".errors")
+            raise
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def timer(self, name):
+        """Decorator version of `timed`."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.timed(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def hit_rates(self):
+        rates = {}
+        for name in self.counters:
+            if name.endswith(".miss"):
+                prefix = name[:-len(".miss")]
+                hits = self.counters[prefix + ".hit"] + self.counters[prefix + ".negative_hit"]
+                total = hits + self.counters[name]
+                rates[prefix] = round(hits / total, 4) if total else 0.0
+        return rates
+
+    def report(self):
+        with self._lock:
+            return {
+                "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started)),
+                "duration": round(time.time() - self.started, 3),
+                "timings": {name: h.summary() for name, h in sorted(self.timings.items())},
+                "counters": dict(sorted(self.counters.items())),
+                "hit_rates": self.hit_rates(),
+                "records": {name: list(values) for name, values in sorted(self.records.items())},
+            }
+
+    def write_json(self, path):
+        tmp = str(path) + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.report(), f, indent=1)
+        os.replace(tmp, path)
+
+    def write_prometheus(self, path, prefix="zotero_sync"):
+        """Prometheus text format, for the node_exporter textfile collector."""
+        label = lambda name: re.sub(r'["\\\n]', "_", name)
+        lines = [f"# TYPE {prefix}_seconds histogram"]
+        with self._lock:
+            for name, h in sorted(self.timings.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets + ("+Inf",), h.counts):
+                    cumulative += n
+                    lines.append(f'{prefix}_seconds_bucket{{op="{label(name)}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_seconds_sum{{op="{label(name)}"}} {h.sum}')
+                lines.append(f'{prefix}_seconds_count{{op="{label(name)}"}} {h.count}')
+            lines.append(f"# TYPE {prefix}_total counter")
+            for name, n in sorted(self.counters.items()):
+                lines.append(f'{prefix}_total{{name="{label(name)}"}} {n}')
+        lines.append(f"# TYPE {prefix}_duration_seconds gauge")
+        lines.append(f"{prefix}_duration_seconds {time.time() - self.started}")
+        tmp = str(path) + ".tmp"
+        with open(tmp, "w") as f:
+            f.write("\n".join(lines) + "\n")
+        os.replace(tmp, path)
+
+    def log_summary(self):
+        for name, h in sorted(self.timings.items()):
+            s = h.summary()
+            logging.info(f"{name}: {s['count']} calls, {s['sum']}s total, mean {s['mean']}s, p90 <= {s['p90']}s")
+
+
+# one registry per process, filled by every module
+METRICS = Metrics()
+timed = METRICS.timed
+timer = METRICS.timer
+count = METRICS.count
+record = METRICS.record
@@ -0,0 +1,147 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import logging
+import multiprocessing
+import os
+import re
+import threading
+
+from metrics import count, timed
+
+# the stamp arXiv puts in the margin of the first page, "arXiv:2310.17558v1 [cs.SD] 26 Oct 2023"
+ARXIV_STAMP_RE = re.compile(r"arXiv:\s*(\d{4}\.\d{4,5})(?:v\d+)?\s*\[")
+DOI_RE = re.compile(r"\b(10\.\d{4,9}/[^\s\"<>]+[^\s\"<>.,;])", re.I)
+ABSTRACT_RE = re.compile(r"\bAbstract\b[\s.:—–-]*(.+?)(?:\n\s*(?:\d\.?\s*|I\.\s*)?Introduction\b|\bIndex Terms\b|\bKeywords\b|$)", re.I | re.S)
+# lines above the title: venue / preprint banners and the arXiv stamp
+BANNER_RE = re.compile(r"arXiv:|preprint|proceedings|conference|journal|workshop|accepted|submitted|copyright|©|\bvol\.|\d{4}\s*$", re.I)
+# lines below the title: authors, affiliations, e-mails
+AUTHOR_RE = re.compile(r"@|,|\d|\*|∗|†|‡|universit|institute|laborator|department|school|college|inc\.|corp", re.I)
+
+
+def parse_header(text):
+    """title / arXiv id / DOI / abstract from the text of a paper's first page, best effort"""
+    header = {"title": "", "arxiv": "", "doi": "", "abstract": ""}
+    m = ARXIV_STAMP_RE.search(text)
+    if m:
+        header["arxiv"] = m.group(1)
+    m = DOI_RE.search(text)
+    if m:
+        header["doi"] = m.group(1)
+    lines = [line.strip() for line in text.splitlines() if line.strip()]
+    for i, line in enumerate(lines[:12]):
+        if len(line.split()) < 3 or BANNER_RE.search(line):
+            continue
+        title = line
+        # titles often wrap to a second line, authors follow
+        if i + 1 < len(lines) and not AUTHOR_RE.search(lines[i + 1]) and len(lines[i + 1].split()) <= 12:
+            title += " " + lines[i + 1]
+        header["title"] = re.sub(r"(\w)- (\w)", r"\1\2", title)
+        break
+    m = ABSTRACT_RE.search(text)
+    if m:
+        header["abstract"] = " ".join(re.sub(r"(\w)-\n(\w)", r"\1\2", m.group(1)).split())
+    return header
+
+
+def check(path, max_chars=5000):
+    """
+    Validates the PDF at `path` and reads its first page.
+    :return: {"ok", "error", "pages", "title", "arxiv", "doi", "abstract"}; "ok" is False for HTML error pages,
+        truncated downloads and files PyPDF2 cannot open
+    """
+    header = {"ok": False, "error": "", "pages": 0, "title": "", "arxiv": "", "doi": "", "abstract": ""}
+    try:
+        with open(path, "rb") as f:
+            head = f.read(1024)
+            f.seek(max(0, os.path.getsize(path) - 2048))
+            tail = f.read()
+    except OSError as e:
+        header["error"] = str(e)
+        return header
+    if b"%PDF-" not in head:
+        header["error"] = "not a PDF"
+        return header
+    if b"%%EOF" not in tail:
+        header["error"] = "truncated"
+        return header
+    try:
+        import PyPDF2
+    except ImportError:
+        # structure checks only
+        header["ok"] = True
+        return header
+    try:
+        reader = PyPDF2.PdfReader(path)
+        header["pages"] = len(reader.pages)
+        text = (reader.pages[0].extract_text() or "") if header["pages"] else ""
+    except Exception as e:
+        header["error"] = f"{type(e).__name__}: {e}"
+        return header
+    header["ok"] = header["pages"] > 0
+    if not header["ok"]:
+        header["error"] = "no pages"
+    header.update(parse_header(text[:max_chars]))
+    return header
+
+
+class PdfChecker:
+    """
+    `check` in a pool of worker processes, so PDF parsing runs next to the pipeline's network-bound threads
+    instead of competing with them for the GIL.
+    """
+    def __init__(self, workers=None, timeout=120):
+        self.workers = workers or max(1, min(4, (os.cpu_count() or 2) - 1))
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._pool = self._start()
+
+    def _start(self, method="fork"):
+        # fork (spawn would re-import the caller's __main__ in every worker), all workers at once and up front,
+        # so create the checker before the pipeline's threads start
+        context = multiprocessing.get_context(method)
+        if method == "forkserver":
+            context.set_forkserver_preload([__name__])
+        pool = ProcessPoolExecutor(self.workers, mp_context=context)
+        pool.submit(int).result()
+        return pool
+
+    def check(self, path):
+        pool = self._pool
+        with timed("pdf.check"):
+            try:
+                header = pool.submit(check, str(path)).result(self.timeout)
+            except Exception as e:
+                # a worker that died on a pathological file, or a hung parse
+                logging.warning(f"PDF check of {path} failed: {type(e).__name__}: {e}")
+                header = {"ok": False, "error": f"{type(e).__name__}: {e}", "pages": 0, "title": "", "arxiv": "", "doi": "", "abstract": ""}
+                if isinstance(e, BrokenProcessPool):
+                    with self._lock:
+                        if self._pool is pool:
+                            # the pipeline's threads run now, and a fork of a process with running threads can
+                            # deadlock in the child; the replacement starts from a single-threaded forkserver
+                            self._pool = self._start("forkserver")
+        count("pdf.checked")
+        if not header["ok"]:
+            count("pdf.corrupt")
+        return header
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait, cancel_futures=True)
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+def shared_checker():
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = PdfChecker(int(os.environ.get("PDFCHECK_WORKERS", 0)) or None)
+        return _shared
+
+def shutdown_checker(wait=True):
+    global _shared
+    with _shared_lock:
+        if _shared is not None:
+            _shared.shutdown(wait=wait)
+            _shared = None
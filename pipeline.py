@@ -0,0 +1,128 @@
+from concurrent.futures import Future
+import logging
+import queue
+import threading
+
+from metrics import count, timed
+
+_DONE = object()
+
+
+class PipelineError(Exception):
+    """Items that failed in a stage; `outputs` holds what came out of the last stage anyway."""
+    def __init__(self, errors, outputs):
+        summary = "; ".join(f"{stage}: {type(e).__name__}: {e}" for stage, _, e in errors[:3])
+        super().__init__(f"{len(errors)} items failed ({summary}{', ...' if len(errors) > 3 else ''})")
+        self.errors = errors
+        self.outputs = outputs
+
+
+class Stage:
+    """
+    One step of a `Pipeline`: `func(item)` runs on `workers` threads and returns the item for the next stage,
+    or None to drop it (already exists, failed, ...).
+    """
+    def __init__(self, name, func, workers=1):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+
+
+class Pipeline:
+    """
+    Stages connected by bounded queues, so every stage works on a different paper at the same time
+    and a slow stage applies back pressure instead of piling up downloads / parses in memory.
+    """
+    def __init__(self, stages, queue_size=8):
+        self.stages = stages
+        self.queue_size = queue_size
+        self.errors = []
+
+    def _work(self, stage, inbox, outbox, finished):
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                inbox.put(_DONE)  # let the sibling workers see it too
+                break
+            try:
+                with timed("stage." + stage.name):
+                    item = stage.func(item)
+            except Exception as e:
+                logging.exception(f"Stage {stage.name} failed: {e}")
+                count(f"stage.{stage.name}.failed")
+                with finished[1]:
+                    self.errors.append((stage.name, item, e))
+                continue
+            if item is not None:
+                outbox.put(item)
+            else:
+                count(f"stage.{stage.name}.dropped")
+        with finished[1]:
+            finished[0] -= 1
+            if finished[0] == 0:
+                outbox.put(_DONE)
+
+    def run(self, items):
+        """
+        Feeds `items` through all stages, returns what comes out of the last one.
+        :raise PipelineError: if any item failed in a stage, after all others went through; an error raised by
+            `items` itself is re-raised once the items fed before it are through
+        """
+        self.errors = []
+        queues = [queue.Queue(self.queue_size) for _ in self.stages] + [queue.Queue()]
+        threads = []
+        for stage, inbox, outbox in zip(self.stages, queues, queues[1:]):
+            finished = [stage.workers, threading.Lock()]
+            for i in range(stage.workers):
+                t = threading.Thread(target=self._work, args=(stage, inbox, outbox, finished), name=f"{stage.name}-{i}", daemon=True)
+                t.start()
+                threads.append(t)
+        feed_error = None
+        try:
+            for item in items:
+                queues[0].put(item)
+        except Exception as e:
+            feed_error = e
+        finally:
+            # the workers always stop, also when `items` raised
+            queues[0].put(_DONE)
+
+        outputs = []
+        while True:
+            item = queues[-1].get()
+            if item is _DONE:
+                break
+            outputs.append(item)
+        for t in threads:
+            t.join()
+        if feed_error is not None:
+            raise feed_error
+        if self.errors:
+            raise PipelineError(self.errors, outputs)
+        return outputs
+
+
+class Once:
+    """
+    Runs `func` at most once per key; concurrent callers with the same key wait for and share the first result.
+    Used so two workers never create the same zotero item.
+    """
+    def __init__(self):
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, key, func, *args, **kwargs):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+        if owner:
+            try:
+                future.set_result(func(*args, **kwargs))
+            except Exception as e:
+                # do not remember failures, a later caller may retry
+                with self._lock:
+                    del self._futures[key]
+                future.set_exception(e)
+        return future.result()
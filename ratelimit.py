@@ -0,0 +1,57 @@
+import threading
+import time
+
+
+class TokenBucket:
+    """Blocking token bucket: `rate` tokens per second, at most `burst` saved up."""
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        # e.g. after a 429: drain the bucket so every caller backs off
+        with self._lock:
+            self._refill()
+            self._tokens = min(self._tokens, 0) - seconds * self.rate
+
+
+class KeyedRateLimiter:
+    """One `TokenBucket` per key (host, service, ...), created on first use."""
+    def __init__(self, rate, burst=1, rates=None):
+        self.rate = rate
+        self.burst = burst
+        self.rates = rates or {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def bucket(self, key):
+        with self._lock:
+            if key not in self._buckets:
+                # "zotero:<library>" gets a bucket of its own at the "zotero" rate
+                default = self.rates.get(key.partition(":")[0], (self.rate, self.burst))
+                rate, burst = self.rates.get(key, default)
+                self._buckets[key] = TokenBucket(rate, burst)
+            return self._buckets[key]
+
+    def acquire(self, key, tokens=1):
+        self.bucket(key).acquire(tokens)
@@ -5,6 +5,10 @@ export SAVE_ROOT="../Papers"
 export ZOTERO_KEY="koz1F8Ij0ROWBghnRtejd4e8"
 export GROUP_ID="5262725"
 export USER_ID=
+# several libraries from one process instead, see libraries.py
+# export LIBRARIES=libraries.json
 
 /usr/bin/python3 main.py
+# or, instead of a cron job, a long-running process with per-source intervals, see daemon.py
+# SCHEDULE="ARXIV_ASR=30m" DAEMON_INTERVAL=2h exec /usr/bin/python3 daemon.py serve
 
@@ -0,0 +1,199 @@
+from concurrent.futures import ThreadPoolExecutor, TimeoutError, as_completed
+import functools
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import arxiv
+import requests
+
+from executor import rate_limit
+from harvest import query_key
+from metrics import count, timed
+
+TIMEOUT = (10, 60)
+API_URL = os.environ.get("ARXIV_API_URL", "https://export.arxiv.org/api/query")
+RSS_URL = os.environ.get("ARXIV_RSS_URL", "http://export.arxiv.org/rss").rstrip("/")
+
+
+class ArxivClient(arxiv.Client):
+    """
+    `arxiv.Client` with request timeouts, paced by the shared "arxiv" rate limit instead of its own delay.
+    Hooks into the client's internals (`_session`, `_parse_feed`, `query_url_format`), arxiv is pinned in
+    requirements.txt for that.
+    """
+    def __init__(self, page_size=100, num_retries=3, timeout=TIMEOUT):
+        super().__init__(page_size=page_size, delay_seconds=0, num_retries=num_retries)
+        self.query_url_format = API_URL + "?{}"
+        self._session.get = functools.partial(self._session.get, timeout=timeout)
+
+    def _parse_feed(self, url, first_page=True, _try_index=0):
+        rate_limit("arxiv")
+        count("arxiv.requests")
+        with timed("arxiv.page"):
+            return super()._parse_feed(url, first_page=first_page, _try_index=_try_index)
+
+
+class FeedCache:
+    """
+    RSS fetches with conditional GET: the ETag / Last-Modified of every feed and the ids it listed are kept
+    in a JSON file, so an unchanged feed costs one 304 and is not parsed again.
+    """
+    def __init__(self, path):
+        self.path = path
+        self.feeds = {}
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path) as f:
+                self.feeds = json.load(f)
+
+    def ids(self, url, timeout=TIMEOUT):
+        """:return: arXiv ids listed by the feed, whether the feed changed since the last fetch"""
+        import feedparser
+
+        with self._lock:
+            cached = dict(self.feeds.get(url, {}))
+        headers = {}
+        if cached.get("etag"):
+            headers["If-None-Match"] = cached["etag"]
+        if cached.get("modified"):
+            headers["If-Modified-Since"] = cached["modified"]
+        res = requests.get(url, headers=headers, timeout=timeout)
+        count("rss.requests")
+        if res.status_code == 304:
+            logging.debug(f"{url}: not modified")
+            count("rss.not_modified")
+            return cached["ids"], False
+        res.raise_for_status()
+        feed = feedparser.parse(res.content)
+        # entry ids look like "oai:arXiv.org:2310.17558v1" (or ".../abs/2310.17558v1" in the old feeds)
+        ids = [re.split(r"[:/]", entry.id)[-1] for entry in feed.entries]
+        logging.info(f"{url}: {len(ids)} entries")
+        with self._lock:
+            self.feeds[url] = {"etag": res.headers.get("ETag"), "modified": res.headers.get("Last-Modified"), "ids": ids, "fetched": time.time()}
+        return ids, True
+
+    def save(self):
+        if not self.path:
+            return
+        with self._lock:
+            tmp = self.path + ".tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.feeds, f, indent=1)
+            os.replace(tmp, self.path)
+
+
+class Source:
+    """A declared query; nothing is fetched until `fetch` is called."""
+    listing = False  # results come from a list of ids, see `HarvestState.mark`
+
+    def __init__(self, name, collection, max_results, tags=()):
+        self.name = name
+        self.collection = collection
+        self.max_results = max_results
+        self.tags = list(tags)
+
+    @property
+    def key(self):
+        raise NotImplementedError
+
+    def fetch(self, client, harvest, backfill=False):
+        """:return: the results not ingested yet"""
+        raise NotImplementedError
+
+    def __repr__(self):
+        return f"{type(self).__name__}({self.key})"
+
+
+class ArxivQuery(Source):
+    """arXiv API search, {"query": ...} or {"id_list": [...]}"""
+    def __init__(self, name, collection, search_query, max_results, tags=()):
+        super().__init__(name, collection, max_results, tags)
+        self.search_query = search_query
+
+    @property
+    def key(self):
+        return query_key(self.name, self.collection, self.search_query)
+
+    def fetch(self, client, harvest, backfill=False):
+        if backfill:
+            return harvest.backfill_results(client, self.key, self.search_query, self.max_results)
+        return harvest.new_results(client, self.key, self.search_query, self.max_results)
+
+
+class IdList(ArxivQuery):
+    listing = True
+
+    def __init__(self, name, collection, ids, tags=()):
+        super().__init__(name, collection, {"id_list": list(ids)}, len(ids), tags)
+
+    def fetch(self, client, harvest, backfill=False):
+        if backfill:
+            return []
+        return harvest.listed_results(client, self.key, self.search_query["id_list"])
+
+
+class RssFeed(Source):
+    """
+    The ids listed by arXiv RSS feeds, looked up through the API. When every listed id was already ingested
+    (as with an unchanged feed), the API is not called at all.
+    """
+    listing = True
+    feed_cache = None  # FeedCache, set by the caller; without it every run re-downloads the feeds
+
+    def __init__(self, name, collection, urls, tags=()):
+        super().__init__(name, collection, 0, tags)
+        self.urls = list(urls)
+
+    @classmethod
+    def categories(cls, name, collection, categories, tags=()):
+        return cls(name, collection, [f"{RSS_URL}/{c}" for c in categories], tags)
+
+    @property
+    def key(self):
+        return query_key(self.name, self.collection, {"rss": self.urls})
+
+    def fetch(self, client, harvest, backfill=False):
+        if backfill:
+            return []
+        cache = self.feed_cache or FeedCache(None)
+        ids, changed = [], False
+        for url in self.urls:
+            listed, modified = cache.ids(url)
+            ids.extend(i for i in listed if i not in ids)
+            changed = changed or modified
+        if not changed:
+            logging.info(f"{self.key}: none of {len(self.urls)} feeds changed")
+        # every listed id, also replacements / cross-lists of old papers the high-water mark would cut off
+        return harvest.listed_results(client, self.key, ids)
+
+
+def fetch_all(sources, client, harvest, backfill=False, workers=4, timeout=600):
+    """
+    Fetches all sources concurrently and yields `(source, results)` as each one finishes.
+    A source that fails or does not finish within `timeout` seconds is logged and skipped, so one slow
+    or unreachable endpoint does not stop the others.
+    """
+    pool = ThreadPoolExecutor(workers, thread_name_prefix="source")
+
+    def fetch(source):
+        with timed("source.fetch"):
+            return source.fetch(client, harvest, backfill)
+
+    futures = {pool.submit(fetch, source): source for source in sources}
+    try:
+        for future in as_completed(futures, timeout=timeout):
+            source = futures[future]
+            try:
+                yield source, future.result()
+            except Exception as e:
+                logging.warning(f"{source}: {e}")
+    except TimeoutError:
+        for future, source in futures.items():
+            if not future.done():
+                logging.warning(f"{source}: no answer after {timeout}s, skipped")
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
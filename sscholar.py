@@ -1,12 +1,97 @@
 from typing import OrderedDict
 import logging
+import os
 import time
-import random
-from collections import defaultdict
 
-from semanticscholar import SemanticScholar
+import requests
+
+from executor import rate_limit, shared_executor
+from lookup_cache import MISS, id_key, shared_cache, title_key
+from metrics import count, timed
+
+API_URL = os.environ.get("S2_API_URL", "https://api.semanticscholar.org/graph/v1").rstrip("/")
+FIELDS = "title,abstract,publicationDate,journal,venue,externalIds,url,fieldsOfStudy,authors,publicationVenue,citationCount"
+BATCH_SIZE = 500  # paper batch endpoint limit
+
+session = requests.Session()
+if os.environ.get("S2_API_KEY"):
+    session.headers["x-api-key"] = os.environ["S2_API_KEY"]
+
+
+def _request(method, path, retries=5, **kwargs):
+    """Rate limited call, backs off on 429 / 5xx. :return: decoded json, or None if not found"""
+    for attempt in range(retries):
+        rate_limit("sscholar")
+        with timed("sscholar.request"):
+            res = session.request(method, API_URL + path, timeout=(10, 60), **kwargs)
+        if res.status_code == 404:
+            return None
+        if res.status_code == 429 or res.status_code >= 500:
+            wait = float(res.headers.get("Retry-After") or 2 ** attempt)
+            logging.debug(f"sscholar {res.status_code}, back off {wait}s")
+            count("sscholar.backoff")
+            shared_executor().limiter.bucket("sscholar").pause(wait)
+            continue
+        res.raise_for_status()
+        return res.json()
+    raise RuntimeError(f"sscholar {path}: still rate limited after {retries} attempts")
+
+
+def paper_id(article):
+    """Semantic Scholar id of a GROBID reference, from its DOI / arXiv idno."""
+    if article.get("doi"):
+        return "DOI:" + article["doi"]
+    if article.get("arxiv"):
+        return "ARXIV:" + article["arxiv"]
+    return None
+
+
+def _cache_key(pid):
+    kind, _, value = pid.partition(":")
+    return id_key(kind, value)
+
+
+def prefetch(articles):
+    """
+    Resolves every reference with a DOI / arXiv id through the paper batch endpoint (500 ids per request),
+    so `retrieve_info` only falls back to a title search for the rest. Answers land in the lookup cache.
+    """
+    cache = shared_cache()
+    ids = {}
+    for art in articles:
+        pid = paper_id(art)
+        if pid and pid not in ids and cache.get("sscholar", _cache_key(pid)) is MISS:
+            ids[pid] = art
+    ids = list(ids.items())
+    for i in range(0, len(ids), BATCH_SIZE):
+        chunk = ids[i:i + BATCH_SIZE]
+        try:
+            papers = _request("POST", "/paper/batch", params={"fields": FIELDS}, json={"ids": [pid for pid, _ in chunk]})
+        except Exception as e:
+            logging.warning(f"sscholar batch of {len(chunk)}: {e}")
+            continue
+        for (pid, art), paper in zip(chunk, papers or []):
+            cache.put("sscholar", _cache_key(pid), paper)
+            if paper is not None:
+                cache.put("sscholar", title_key(art["title"]), paper)
+        logging.info(f"sscholar batch: {sum(p is not None for p in papers or [])} of {len(chunk)} resolved")
+
+
+def _search(title):
+    res = _request("GET", "/paper/search", params={"query": title, "limit": 1, "fields": FIELDS})
+    results = (res or {}).get("data") or []
+    return results[0] if results else None
+
+
+def lookup(article):
+    cache = shared_cache()
+    pid = paper_id(article)
+    if pid:
+        paper = cache.get("sscholar", _cache_key(pid))
+        if paper is not MISS and paper is not None:
+            return paper
+    return cache.cached("sscholar", title_key(article["title"]), _search, article["title"])
 
-sch = SemanticScholar()
 
 def retrieve_info(article, zot):
     # template = zot.item_template('journalArticle')
@@ -21,26 +106,26 @@ def retrieve_info(article, zot):
     template["proceedingsTitle"] = article["journal"]
 
     try:
-        time.sleep(random.random()/2)
-        results = sch.search_paper(article["title"], limit=1)
+        best_res = lookup(article)
     except Exception as e:
         logging.warning(article["title"] + " parsing by sscholar: " + str(e))
         return template
 
-    if len(results) == 0:
+    if best_res is None:
         return template
-    best_res = results[0]
     logging.debug("Get result from semantic scholar:\n" + str(best_res))
-    
-    template['abstractNote'] = best_res["abstract"]
-    template["date"] = best_res["publicationDate"]
-    template['proceedingsTitle'] = best_res["journal"].get("name", "") # or ["venue"]
+    journal = best_res.get("journal") or {}
+    external_ids = best_res.get("externalIds") or {}
+
+    template['abstractNote'] = best_res["abstract"] or ""
+    template["date"] = best_res["publicationDate"] or template["date"]
+    template['proceedingsTitle'] = journal.get("name", "") # or ["venue"]
     template['conferenceName'] = best_res["venue"]
-    template['volume'] = best_res["journal"].get("volume", "")
-    template['pages'] = best_res["journal"].get("pages", "")
-    template['DOI'] = best_res["externalIds"].get("DOI", "")
-    template['archive'] = best_res["externalIds"].get("ArXiv", "")
-    template['archiveLocation'] = "https://arxiv.org/pdf/" + best_res["externalIds"].get("ArXiv", "") + ".pdf"
+    template['volume'] = journal.get("volume", "")
+    template['pages'] = journal.get("pages", "")
+    template['DOI'] = external_ids.get("DOI", "")
+    template['archive'] = external_ids.get("ArXiv", "")
+    template['archiveLocation'] = "https://arxiv.org/pdf/" + external_ids.get("ArXiv", "") + ".pdf"
     template['url'] = template['archiveLocation']
     if not template['archive']:
         #template['url'] = best_res["publicationVenue"].get("url", "")
@@ -52,10 +137,10 @@ def retrieve_info(article, zot):
         template['creators'] = [{'creatorType': 'author', 'firstName': au["name"].split(" ")[0] , 'lastName': au["name"].split(" ")[1]} for au in best_res["authors"]]
     except:
         pass
-    
+
     template['extra'] = "pub_urls:\n" + \
-        " - public:" + best_res["publicationVenue"].get("url","") + "\n" + \
+        " - public:" + (best_res.get("publicationVenue") or {}).get("url","") + "\n" + \
         " - semantic-sch: " + best_res["url"] + "\n" + \
-        "DBLP-ID: " + best_res["externalIds"].get("DBLP","") + "\n" + \
+        "DBLP-ID: " + external_ids.get("DBLP","") + "\n" + \
         "citations: " + str(best_res["citationCount"]) + " till " + time.strftime("%Y-%m-%d", time.localtime()) + "\n"
     return template
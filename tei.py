@@ -0,0 +1,175 @@
+from io import BytesIO
+import logging
+
+from lxml import etree
+
+from library import arxiv_id
+
+XML_ID = "{http://www.w3.org/XML/1998/namespace}id"
+# top level blocks, dropped as soon as they are read so long papers are not kept in memory twice
+_CLEAR_PARENTS = {"body", "back", "listBibl"}
+
+
+def _name(el):
+    return el.tag.rpartition("}")[2] if isinstance(el.tag, str) else ""
+
+
+def _text(el):
+    return "".join(el.itertext())
+
+
+def _text_strip(el):
+    return "".join(s.strip() for s in el.itertext())
+
+
+def _first(el, name, **attrs):
+    for child in el.iter():
+        if _name(child) == name and all(child.get(k) == v for k, v in attrs.items()):
+            return child
+    return None
+
+
+def _all(el, name):
+    return [child for child in el.iter() if _name(child) == name]
+
+
+def _person(author):
+    """"first [middle] last" of a TEI author, like scipdf.parse_authors"""
+    first, middle, last = (_first(author, "forename", type="first"), _first(author, "forename", type="middle"), _first(author, "surname"))
+    first = _text(first).strip() if first is not None else ""
+    middle = _text(middle).strip() if middle is not None else ""
+    last = _text(last).strip() if last is not None else ""
+    return " ".join([first, middle, last]) if middle else first + " " + last
+
+
+def _reference(bibl):
+    title = _first(bibl, "title", level="a")
+    if title is None:
+        title = _first(bibl, "title", level="m")
+    journal = _first(bibl, "title", level="j")
+    journal = _text(journal) if journal is not None else ""
+    if journal == "":
+        publisher = _first(bibl, "publisher")
+        journal = _text(publisher) if publisher is not None else ""
+    date = _first(bibl, "date")
+    doi = _first(bibl, "idno", type="DOI")
+    arxiv = _first(bibl, "idno", type="arXiv")
+    return {
+        "title": _text(title) if title is not None else "",
+        "journal": journal,
+        "year": date.get("when") if date is not None else "",
+        "authors": "; ".join(_person(author) for author in _all(bibl, "author")),
+        # ids let the resolvers look references up in bulk instead of searching by title
+        "doi": _text(doi).strip() if doi is not None else "",
+        "arxiv": arxiv_id(_text(arxiv)) if arxiv is not None else "",
+    }
+
+
+def _author(author):
+    """(name, ["orgnames, country", ...]) of an author with affiliations, else None"""
+    affs = _all(author, "affiliation")
+    forename, surname = _first(author, "forename"), _first(author, "surname")
+    if not affs or forename is None or surname is None:
+        return None
+    affiliations = []
+    for aff in affs:
+        country = _first(aff, "country")
+        combined = " ".join(_text_strip(org) for org in _all(aff, "orgName")) + ", " + (_text_strip(country) if country is not None else "")
+        if combined not in affiliations:
+            affiliations.append(combined)
+    return (_text(forename) + " " + _text(surname), affiliations)
+
+
+def _section(div):
+    children = [child for child in div if isinstance(child.tag, str)]
+    heading = ""
+    if children and _name(children[0]) == "head":
+        heading = _text(children[0])
+        children = children[1:]
+    text = "\n".join(_text(child) for child in children)
+    if heading == "" and text == "":
+        return None
+    refs = [ref.get("type") for ref in _all(div, "ref")]
+    return {"heading": heading, "text": text, "n_publication_ref": refs.count("bibr"), "n_figure_ref": refs.count("figure")}
+
+
+def _figure(figure):
+    label = _first(figure, "label")
+    figure_type = figure.get("type") or ""
+    if figure_type == "table":
+        desc, table = _first(figure, "figDesc"), _first(figure, "table")
+        caption, data = _text(desc) if desc is not None else "", _text(table) if table is not None else ""
+    else:
+        caption, data = _text(figure), ""
+    return {
+        "figure_label": _text(label) if label is not None else "",
+        "figure_type": figure_type,
+        "figure_id": figure.get(XML_ID) or "",
+        "figure_caption": caption,
+        "figure_data": data,
+    }
+
+
+def _formula(formula):
+    coords = formula.get("coords") or ""
+    if coords == "":
+        return None
+    return {"formula_id": formula.get(XML_ID) or "", "formula_text": _text(formula), "formula_coordinates": [float(x) for x in coords.split(",")]}
+
+
+def parse(tei, name=""):
+    """
+    GROBID TEI XML -> the same dict as `main.parse_tei` (title, date, abstract, DOI, keywords, __refs, __authors,
+    __sections, __figures, __formulas), in one iterparse pass instead of a BeautifulSoup tree plus scipdf walks.
+    """
+    if isinstance(tei, str):
+        tei = tei.encode()
+    parsed = {"title": "", "date": "", "abstract": "", "DOI": "", "keywords": []}
+    parsed.update({"__refs": [], "__authors": [], "__sections": [], "__figures": [], "__formulas": []})
+    found = set()
+    stack = []  # names of the open ancestors
+    try:
+        for event, el in etree.iterparse(BytesIO(tei), events=("start", "end"), huge_tree=True, remove_comments=True):
+            tag = _name(el)
+            if event == "start":
+                stack.append(tag)
+                continue
+            stack.pop()
+            if tag == "title" and el.get("type") == "main" and "title" not in found:
+                found.add("title")
+                parsed["title"] = _text(el).strip()
+            elif tag == "publicationStmt" and "date" not in found:
+                found.add("date")
+                date = _first(el, "date")
+                parsed["date"] = date.get("when") if date is not None else ""
+            elif tag == "abstract" and "abstract" not in found:
+                found.add("abstract")
+                parsed["abstract"] = "".join(" ".join(_text(p) for p in div if isinstance(p.tag, str)) for div in el if isinstance(div.tag, str))
+            elif tag == "idno" and el.get("type") == "DOI" and "DOI" not in found:
+                found.add("DOI")
+                parsed["DOI"] = _text(el)
+            elif tag == "keywords" and "keywords" not in found:
+                found.add("keywords")
+                parsed["keywords"] = [_text(term).lower() for term in _all(el, "term")]
+            elif tag == "author" and "affiliation" in (_name(child) for child in el.iter()):
+                author = _author(el)
+                if author is not None:
+                    parsed["__authors"].append(author)
+            elif tag == "biblStruct" and "text" in stack and "listBibl" in stack:
+                parsed["__refs"].append(_reference(el))
+            elif tag == "div" and "text" in stack and el.get("type") is None:
+                section = _section(el)
+                if section is not None:
+                    parsed["__sections"].append(section)
+            elif tag == "figure":
+                parsed["__figures"].append(_figure(el))
+            elif tag == "formula":
+                formula = _formula(el)
+                if formula is not None:
+                    parsed["__formulas"].append(formula)
+
+            if stack and stack[-1] in _CLEAR_PARENTS:
+                el.clear(keep_tail=True)
+    except etree.XMLSyntaxError as e:
+        logging.warning(name + ":" + str(e))
+    return parsed
@@ -0,0 +1,171 @@
+import re
+import threading
+
+import numpy as np
+
+from localdb import arxiv_id, normalize_title
+from metrics import count
+
+_PRIME = (1 << 31) - 1
+# numbers and roman numerals tell "Part I" from "Part II" and "WaveNet 2" from "WaveNet", titles that are otherwise near-identical
+_NUMBER_RE = re.compile(r"^(\d+|[ivx]+)$")
+
+
+def shingles(norm):
+    """character 3-grams of a normalized title without its spaces, so re-hyphenated / re-spaced words still share them"""
+    compact = norm.replace(" ", "")
+    return {compact[i:i + 3] for i in range(max(1, len(compact) - 2))}
+
+
+def jaccard(a, b):
+    """of two sorted arrays of unique gram ids"""
+    if not len(a) or not len(b):
+        return 0.0
+    both = len(np.intersect1d(a, b, assume_unique=True))
+    return both / (len(a) + len(b) - both)
+
+
+class TitleIndex:
+    """
+    Title / DOI / arXiv id -> key lookups that tolerate the title differences GROBID and citation styles
+    introduce (punctuation, LaTeX, accents, hyphenation, OCR'd letters).
+    Normalized titles are matched exactly first, then through MinHash LSH over their character 3-grams:
+    `bands` x `rows` hashes per title, and a candidate sharing any band is accepted when the Jaccard similarity
+    of the 3-grams is at least `threshold` and both titles carry the same numbers.
+    The LSH threshold (1 / bands) ** (1 / rows), about 0.79 for 10 x 10, sits a little below `threshold`: titles
+    that merely share vocabulary rarely become candidates, while ~97% of the pairs at 0.85 still do.
+    The 3-gram ids of every title are kept to compare the candidates with.
+    """
+    def __init__(self, threshold=0.85, bands=10, rows=10, min_length=12, seed=1):
+        self.threshold = threshold
+        self.bands, self.rows = bands, rows
+        self.min_length = min_length  # shorter titles are only matched exactly
+        rng = np.random.default_rng(seed)
+        self._a = rng.integers(1, _PRIME, bands * rows, dtype=np.uint64)
+        self._b = rng.integers(0, _PRIME, bands * rows, dtype=np.uint64)
+        self._lock = threading.RLock()
+        self._titles = {}  # key -> normalized title
+        self._grams = {}  # key -> its 3-grams, see `_gram_ids`
+        self._ids = {}  # key -> (doi, arxiv id)
+        self._by_title, self._by_doi, self._by_arxiv = {}, {}, {}
+        self._buckets = [{} for _ in range(bands)]
+        self._bands = {}  # key -> its band hashes, for `remove`
+
+    def __len__(self):
+        return len(self._titles)
+
+    @staticmethod
+    def _gram_ids(grams):
+        """3-grams -> sorted unique integers < p, what signatures and similarities are computed from"""
+        return np.unique(np.fromiter(map(hash, grams), dtype=np.int64, count=len(grams)).view(np.uint64) % _PRIME)
+
+    def _hashes(self, x):
+        """(a * x + b) mod p of every gram id x for every hash function (a, b) at once; all factors < 2^31, no overflow"""
+        return (self._a[:, None] * x[None, :] + self._b[:, None]) % _PRIME
+
+    def _bands_of(self, sig):
+        return [sig[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def _signature(self, x):
+        return self._bands_of(self._hashes(x).min(axis=1))
+
+    def _insert(self, key, title, doi, arxiv):
+        """indexes everything but the LSH bands; :return: the normalized title"""
+        norm = normalize_title(title) if title else ""
+        doi, arxiv = (doi or "").lower(), arxiv_id(arxiv)
+        self.remove(key)
+        self._titles[key], self._ids[key] = norm, (doi, arxiv)
+        for index, k in ((self._by_title, norm), (self._by_doi, doi), (self._by_arxiv, arxiv)):
+            if k:
+                index.setdefault(k, key)
+        return norm
+
+    def _insert_bands(self, key, x, bands):
+        for bucket, band in zip(self._buckets, bands):
+            bucket.setdefault(band, set()).add(key)
+        self._bands[key] = bands
+        self._grams[key] = x
+
+    def add(self, key, title="", doi="", arxiv=""):
+        with self._lock:
+            norm = self._insert(key, title, doi, arxiv)
+            if len(norm.replace(" ", "")) >= self.min_length:
+                x = self._gram_ids(shingles(norm))
+                self._insert_bands(key, x, self._signature(x))
+
+    def add_many(self, entries, chunk=1000):
+        """`add` for many (key, title, doi, arxiv) at once, with the signatures of a whole chunk computed together"""
+        entries = list(entries)
+        with self._lock:
+            for start in range(0, len(entries), chunk):
+                keys, grams = [], []
+                for key, title, doi, arxiv in entries[start:start + chunk]:
+                    norm = self._insert(key, title, doi, arxiv)
+                    if len(norm.replace(" ", "")) >= self.min_length:
+                        keys.append(key)
+                        grams.append(self._gram_ids(shingles(norm)))
+                if not keys:
+                    continue
+                offsets = np.cumsum([0] + [len(x) for x in grams[:-1]])
+                sigs = np.minimum.reduceat(self._hashes(np.concatenate(grams)), offsets, axis=1)
+                for key, x, sig in zip(keys, grams, np.ascontiguousarray(sigs.T)):
+                    self._insert_bands(key, x, self._bands_of(sig))
+
+    def remove(self, key):
+        with self._lock:
+            norm = self._titles.pop(key, None)
+            if norm is None:
+                return
+            for index, k in zip((self._by_title, self._by_doi, self._by_arxiv), (norm,) + self._ids.pop(key)):
+                if k and index.get(k) == key:
+                    del index[k]
+            self._grams.pop(key, None)
+            for bucket, band in zip(self._buckets, self._bands.pop(key, ())):
+                bucket[band].discard(key)
+                if not bucket[band]:
+                    del bucket[band]
+
+    def match(self, title):
+        """:return: (key, similarity) of the closest indexed title, (None, 0.0) if none is close enough"""
+        norm = normalize_title(title)
+        with self._lock:
+            if norm in self._by_title:
+                return self._by_title[norm], 1.0
+            if len(norm.replace(" ", "")) < self.min_length:
+                return None, 0.0
+            grams = self._gram_ids(shingles(norm))
+            candidates = set()
+            for bucket, band in zip(self._buckets, self._signature(grams)):
+                candidates.update(bucket.get(band, ()))
+            numbers = {t for t in norm.split() if _NUMBER_RE.match(t)}
+            best, score = None, 0.0
+            for key in candidates:
+                other = self._titles[key]
+                if {t for t in other.split() if _NUMBER_RE.match(t)} != numbers:
+                    continue
+                s = jaccard(grams, self._grams[key])
+                if s > score:
+                    best, score = key, s
+        if score < self.threshold:
+            return None, 0.0
+        count("titles.fuzzy_match")
+        return best, score
+
+    def find(self, title="", doi="", arxiv=""):
+        """key of the entry with the same DOI or arXiv id, else with a matching title; None if there is none"""
+        doi, arxiv = (doi or "").lower(), arxiv_id(arxiv)
+        with self._lock:
+            if doi and doi in self._by_doi:
+                return self._by_doi[doi]
+            if arxiv and arxiv in self._by_arxiv:
+                return self._by_arxiv[arxiv]
+        return self.match(title)[0] if title else None
+
+    def setdefault(self, key, title="", doi="", arxiv=""):
+        """key of the matching entry, or `key` after adding it if there is none (atomic)"""
+        with self._lock:
+            found = self.find(title, doi, arxiv)
+            if found is None:
+                self.add(key, title, doi, arxiv)
+                return key
+            return found
@@ -0,0 +1,333 @@
+from concurrent.futures import Future
+import functools
+import logging
+import secrets
+import threading
+import time
+
+from executor import rate_limit
+from metrics import count, timed
+
+# zotero object keys, generated locally so children / relations can point at items before they are written
+KEY_CHARS = "23456789ABCDEFGHIJKLMNPQRSTUVWXYZ"
+MAX_BATCH = 50  # zotero web API limit per write request
+
+
+def new_key():
+    return "".join(secrets.choice(KEY_CHARS) for _ in range(8))
+
+
+class _Entry:
+    def __init__(self, obj, after, uris=None):
+        self.obj = obj
+        self.after = after
+        self.uris = uris  # set for a backlink update of an existing item
+        self.future = Future()
+        self.attempts = 0
+        self.added = time.monotonic()
+
+
+def _copy_result(target, future):
+    if future.exception() is not None:
+        target.set_exception(future.exception())
+    else:
+        target.set_result(future.result())
+
+
+def _relations(item):
+    """the item's relations, with `dc:relation` as a list"""
+    relations = dict(item["data"].get("relations") or {})
+    current = relations.get("dc:relation", [])
+    relations["dc:relation"] = [current] if isinstance(current, str) else list(current)
+    return relations
+
+
+class BatchWriter:
+    """
+    Collects items / notes from all workers and writes them with `zot.create_items` in batches of up to 50.
+    `add` returns a Future resolved with the created item (the `successful` entry of the response);
+    only the entries listed as `failed` are retried. Objects passed with `after=<parent future>` (child notes)
+    are held back until the parent is written.
+    `add_relations` queues backlinks to existing items in the same batches, as key + version updates: the URIs
+    added to one item before its update goes out are merged into that one update, and the updates that find the
+    item changed (412) are retried after one `itemKey=` read of all of them.
+    A batch is sent when it is full or its oldest entry waited `max_delay` seconds.
+    """
+    def __init__(self, zot, batch_size=MAX_BATCH, max_delay=1.0, retries=2):
+        self.zot = zot
+        self.batch_size = min(batch_size, MAX_BATCH)
+        self.max_delay = max_delay
+        self.retries = retries
+        self.requests = 0
+        self._pending = []
+        self._items = {}  # key -> the latest known state of an item backlinks were added to
+        self._updates = {}  # key -> its queued backlink update, not sent yet
+        self._open = set()
+        self._inflight = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, name="zotero-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, obj, after=None):
+        obj.setdefault("key", new_key())
+        entry = _Entry(obj, after)
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BatchWriter is closed")
+            self._pending.append(entry)
+            self._open.add(entry.future)
+            self._cond.notify_all()
+        entry.future.add_done_callback(self._done)
+        return entry.future
+
+    def add_relations(self, item, uris):
+        """
+        Adds `uris` to the existing item's `dc:relation`.
+        :return: a Future resolved with the item with its new relations and version
+        """
+        key = item["key"]
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("BatchWriter is closed")
+            known = self._items.get(key)
+            if known is None or known["version"] < item["version"]:
+                self._items[key] = known = item
+            entry = self._updates.get(key)
+            if entry is not None:
+                entry.uris.extend(u for u in uris if u not in entry.uris)
+                return entry.future
+            uris = [u for u in uris if u not in _relations(known)["dc:relation"]]
+            if not uris:
+                future = Future()
+                future.set_result(known)
+                return future
+            entry = self._updates[key] = _Entry({"key": key}, None, uris)
+            self._pending.append(entry)
+            self._open.add(entry.future)
+            self._cond.notify_all()
+        entry.future.add_done_callback(self._done)
+        return entry.future
+
+    def _update(self, entry):
+        """the update object of a backlink entry against the latest known version, None if nothing is left to add"""
+        known = self._items[entry.obj["key"]]
+        relations = _relations(known)
+        new = [u for u in entry.uris if u not in relations["dc:relation"]]
+        if not new:
+            return None
+        relations["dc:relation"] += new
+        return {"key": known["key"], "version": known["version"], "relations": relations}
+
+    def _requeue(self, entry):
+        """puts a failed backlink update back, merged into the update queued for the same item meanwhile"""
+        key = entry.obj["key"]
+        queued = self._updates.get(key)
+        if queued is None:
+            self._updates[key] = entry
+            self._pending.append(entry)
+            return
+        queued.uris[:0] = [u for u in entry.uris if u not in queued.uris]
+        queued.attempts = max(queued.attempts, entry.attempts)
+        queued.future.add_done_callback(functools.partial(_copy_result, entry.future))
+
+    def _done(self, future):
+        with self._cond:
+            self._open.discard(future)
+
+    def _ready(self, force):
+        """Takes the next batch from the pending entries, or returns [] if it should wait."""
+        ready, now = [], time.monotonic()
+        for entry in list(self._pending):
+            if entry.after is not None:
+                if not entry.after.done():
+                    continue
+                if entry.after.exception() is not None:
+                    self._pending.remove(entry)
+                    entry.future.set_exception(RuntimeError(f"parent of {entry.obj['key']} was not created"))
+                    continue
+            ready.append(entry)
+        if not ready:
+            return []
+        if not force and len(ready) < self.batch_size and now - min(e.added for e in ready) < self.max_delay:
+            return []
+        batch = []
+        for entry in ready:
+            if len(batch) == self.batch_size:
+                break
+            self._pending.remove(entry)
+            if entry.uris is not None:
+                # built now: the batches before this one are answered, their versions known
+                key = entry.obj["key"]
+                del self._updates[key]
+                update = self._update(entry)
+                if update is None:
+                    entry.future.set_result(self._items[key])
+                    continue
+                entry.obj = update
+            batch.append(entry)
+        if not batch:
+            return []
+        self._inflight += 1
+        return batch
+
+    def _loop(self):
+        while True:
+            with self._cond:
+                while True:
+                    batch = self._ready(force=self._closed)
+                    if batch or (self._closed and not self._pending):
+                        break
+                    self._cond.wait(self.max_delay / 4)
+            if not batch:
+                return
+            try:
+                self._write(batch)
+            finally:
+                with self._cond:
+                    self._inflight -= 1
+                    self._cond.notify_all()
+
+    def _write(self, batch):
+        rate_limit(rate_service(self.zot))
+        self.requests += 1
+        try:
+            with timed("zotero.create_items"):
+                response = client(self.zot).create_items([e.obj for e in batch])
+        except Exception as e:
+            logging.warning(f"create_items for {len(batch)} objects: {e}")
+            response = {"successful": {}, "unchanged": {}, "failed": {str(i): str(e) for i in range(len(batch))}}
+        successful, failures = response.get("successful", {}), response.get("failed", {})
+        updated = sum(1 for idx, entry in enumerate(batch) if entry.uris is not None and str(idx) in successful)
+        logging.info(f"create_items: {len(successful) - updated} created, {updated} updated, {len(failures)} failed")
+        count("zotero.created", len(successful) - updated)
+        count("zotero.updated", updated)
+        count("zotero.failed", len(failures))
+
+        retry, conflicts = [], []
+        for idx, entry in enumerate(batch):
+            idx = str(idx)
+            if idx in successful:
+                if entry.uris is not None:
+                    with self._cond:
+                        self._items[entry.obj["key"]] = successful[idx]
+                entry.future.set_result(successful[idx])
+            elif idx in response.get("unchanged", {}):
+                if entry.uris is not None:
+                    # the relations were there already
+                    known = self._items[entry.obj["key"]]
+                    entry.future.set_result({**known, "data": {**known["data"], "relations": entry.obj["relations"]}})
+                else:
+                    # stored by an earlier attempt of a retried batch (keys are pre-assigned)
+                    entry.future.set_result(self._stored(response["unchanged"][idx], entry.obj))
+            else:
+                entry.attempts += 1
+                failed = failures.get(idx, "missing in response")
+                if entry.uris is not None and isinstance(failed, dict) and failed.get("code") == 412:
+                    # Item has been modified since specified version
+                    conflicts.append(entry.obj["key"])
+                    count("zotero.version_conflicts")
+                if entry.attempts <= self.retries:
+                    logging.debug(f"Retry {entry.obj.get('title', entry.obj['key'])}: {failed}")
+                    retry.append(entry)
+                    count("zotero.retries")
+                else:
+                    logging.warning(f"Failed to write {entry.obj.get('title', entry.obj['key'])}: {failed}")
+                    entry.future.set_exception(RuntimeError(str(failed)))
+        latest = self._read(conflicts) if conflicts else []
+        if retry or latest:
+            with self._cond:
+                for item in latest:
+                    self._items[item["key"]] = item
+                for entry in retry:
+                    if entry.uris is not None:
+                        self._requeue(entry)
+                    else:
+                        self._pending.append(entry)
+
+    def _read(self, keys):
+        """the current state of the items `keys` (at most 50), in one request"""
+        zot = client(self.zot)
+        rate_limit(rate_service(zot))
+        try:
+            with timed("zotero.items"):
+                return zot.items(itemKey=",".join(keys), limit=len(keys))
+        except Exception as e:
+            logging.warning(f"Read {len(keys)} changed items: {e}")
+            return []
+
+    def _stored(self, key, obj):
+        """the item as the server has it, for an `unchanged` entry; built from the client if it cannot be read"""
+        zot = client(self.zot)
+        rate_limit(rate_service(zot))
+        try:
+            return zot.item(key)
+        except Exception as e:
+            logging.warning(f"Read back {key}: {e}")
+        version = zot.request.headers.get("Last-Modified-Version") if zot.request is not None else None
+        library = {"type": zot.library_type[:-1], "id": int(zot.library_id) if str(zot.library_id).isdigit() else zot.library_id}
+        return {"key": key, "version": int(version or 0), "library": library, "data": {**obj, "key": key}}
+
+    def flush(self):
+        """Blocks until everything added so far is written."""
+        with self._cond:
+            futures = list(self._open)
+        for future in futures:
+            try:
+                future.result()
+            except Exception:
+                pass
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+def get_writer(zot):
+    """One BatchWriter per zotero library client."""
+    with _writers_lock:
+        if id(zot) not in _writers:
+            _writers[id(zot)] = BatchWriter(zot)
+        return _writers[id(zot)]
+
+def close_writers():
+    with _writers_lock:
+        writers = list(_writers.values())
+        _writers.clear()
+    for writer in writers:
+        writer.close()
+
+
+def rate_service(zot):
+    """rate limit key of a client's requests, per library when the multi-library mode set one"""
+    return getattr(zot, "rate_service", "zotero")
+
+
+_clients = threading.local()
+
+def client(zot):
+    """
+    The calling thread's own copy of the pyzotero client `zot`. pyzotero keeps the state of a call on the client
+    (`request`, `url_params`, `links`), so threads sharing one client read each other's responses.
+    Copies share `zot`'s item template cache.
+    """
+    clients = _clients.__dict__.setdefault("clients", {})
+    shared, copy = clients.get(id(zot), (None, None))
+    if shared is not zot:
+        from pyzotero import zotero
+        copy = zotero.Zotero(zot.library_id, zot.library_type[:-1], zot.api_key, zot.preserve_json_order, zot.locale)
+        copy.endpoint = zot.endpoint
+        copy.templates = zot.templates
+        copy.rate_service = rate_service(zot)
+        clients[id(zot)] = (zot, copy)
+    return copy
+
+
+def item_uri(item):
+    library = item.get("library", {})
+    return "http://zotero.org/{}s/{}/items/{}".format(library.get("type", "group"), library["id"], item["key"])